@@ -0,0 +1,153 @@
+"""
+AudD.io music recognition client for PasteFind
+"""
+import hashlib
+import logging
+import os
+import threading
+import urllib.parse
+
+import requests
+
+from http_client import http
+from workers import SingleFlight, run_stage
+
+logger = logging.getLogger(__name__)
+
+AUDD_API_URL = 'https://api.audd.io/'
+
+
+def file_fingerprint(file_path: str) -> str:
+    """SHA-256 of the clip bytes, used to coalesce identical recognitions."""
+    hasher = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        while chunk := f.read(1024 * 1024):
+            hasher.update(chunk)
+    return f"audio:{hasher.hexdigest()}"
+
+
+class AudDClient:
+    """
+    Async AudD client. Concurrent recognitions for the same key (clip hash,
+    content hash or media URL) share a single in-flight API call.
+    """
+
+    def __init__(self, api_token: str, api_url: str = AUDD_API_URL, http_client=http):
+        self.api_token = api_token
+        self.api_url = api_url
+        self.http = http_client
+        self._flights = SingleFlight()
+        self._lock = threading.Lock()
+        self._calls = 0
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.api_token)
+
+    async def recognize(self, file_path: str, key: str = None) -> dict:
+        """Recognize file_path in the recognize pool; identical keys are coalesced."""
+        key = key or file_fingerprint(file_path)
+        return await self._flights.run(key, lambda: run_stage("recognize", self.recognize_file, file_path))
+
+    def recognize_file(self, file_path: str) -> dict:
+        """Send audio file to AudD.io API for music recognition (blocking)."""
+        if not self.api_token:
+            logger.warning("[AudD] No API token configured")
+            return {"error": "API token not configured"}
+
+        with self._lock:
+            self._calls += 1
+
+        try:
+            logger.info(f"[AudD] Analyzing: {file_path}")
+            file_size = os.path.getsize(file_path)
+            logger.info(f"[AudD] File size: {file_size} bytes")
+
+            with open(file_path, 'rb') as f:
+                files = {'file': f}
+                data = {
+                    'api_token': self.api_token,
+                    'return': 'apple_music,spotify,deezer'
+                }
+                response = self.http.post(self.api_url, files=files, data=data, timeout=60)
+                result = response.json()
+
+            logger.info(f"[AudD] Status: {result.get('status')}")
+
+            if result.get('status') != 'success':
+                error_msg = result.get('error', {})
+                if isinstance(error_msg, dict):
+                    error_msg = error_msg.get('error_message', 'Unknown error')
+                return {"error": f"AudD error: {error_msg}"}
+
+            if result.get('result') is None:
+                return {"error": "no_match"}
+
+            music = result['result']
+            title = music.get('title', 'Unknown Title')
+            artist = music.get('artist', 'Unknown Artist')
+
+            # --- Cover art (priority: Spotify > Apple Music > Deezer) ---
+            image = ''
+            spotify_data = music.get('spotify') or {}
+            if spotify_data and 'album' in spotify_data:
+                images = spotify_data['album'].get('images', [])
+                if images:
+                    image = images[0].get('url', '')
+
+            if not image:
+                apple_data = music.get('apple_music') or {}
+                artwork = apple_data.get('artwork', {})
+                if artwork:
+                    url_template = artwork.get('url', '')
+                    if url_template:
+                        image = url_template.replace('{w}', '600').replace('{h}', '600')
+
+            if not image:
+                deezer_data = music.get('deezer') or {}
+                album_data = deezer_data.get('album') or {}
+                image = album_data.get('cover_xl', '') or album_data.get('cover_big', '')
+
+            # --- External links ---
+            spotify_url = ''
+            apple_music_url = ''
+
+            if spotify_data:
+                ext_urls = spotify_data.get('external_urls', {})
+                spotify_url = ext_urls.get('spotify', '')
+
+            apple_data = music.get('apple_music') or {}
+            if apple_data:
+                apple_music_url = apple_data.get('url', '')
+
+            # YouTube search fallback
+            query = urllib.parse.quote(f"{title} {artist}")
+            youtube_url = f"https://www.youtube.com/results?search_query={query}"
+
+            if not spotify_url:
+                spotify_url = f"https://open.spotify.com/search/{query}"
+
+            if not apple_music_url:
+                apple_music_url = f"https://music.apple.com/search?term={query}"
+
+            return {
+                "title": title,
+                "subtitle": artist,
+                "image": image,
+                "spotify_url": spotify_url,
+                "youtube_url": youtube_url,
+                "apple_music": apple_music_url,
+                "service": "audd"
+            }
+
+        except requests.exceptions.Timeout:
+            logger.error("[AudD] Timeout")
+            return {"error": "AudD timeout"}
+        except Exception as e:
+            logger.error(f"[AudD] Exception: {e}")
+            return {"error": str(e)}
+
+    def stats(self) -> dict:
+        with self._lock:
+            calls = self._calls
+        return {"api_calls": calls, **self._flights.stats()}
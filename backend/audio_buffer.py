@@ -0,0 +1,136 @@
+"""
+Shared decoded audio for PasteFind
+A clip is decoded once to mono float32 PCM. Every analysis stage reads views
+of that buffer, and the clip uploaded to the recognition provider is encoded
+from it instead of from the source file.
+"""
+import logging
+import os
+
+import numpy as np
+
+from ffmpeg_runner import ffmpeg
+
+logger = logging.getLogger(__name__)
+
+PCM_SAMPLE_RATE = 16000
+RESAMPLE_TAPS = 63
+
+# Recognition profiles: AudD only needs a compact mono clip, not a 128k stereo MP3
+RECOGNITION_PROFILES = {
+    'opus': {'codec': 'libopus', 'ext': 'ogg', 'bitrate': '32k'},
+    'aac': {'codec': 'aac', 'ext': 'm4a', 'bitrate': '48k'},
+    'pcm': {'codec': 'pcm_s16le', 'ext': 'wav', 'bitrate': None},
+    'mp3': {'codec': 'libmp3lame', 'ext': 'mp3', 'bitrate': '128k'},
+}
+RECOGNITION_PROFILE = RECOGNITION_PROFILES.get(os.getenv('RECOGNITION_PROFILE', 'opus'), RECOGNITION_PROFILES['opus'])
+RECOGNITION_SAMPLE_RATE = int(os.getenv('RECOGNITION_SAMPLE_RATE', 16000))
+
+
+def recognition_encode_args() -> list:
+    """ffmpeg output arguments for the configured recognition profile."""
+    args = ['-vn', '-ac', '1', '-ar', str(RECOGNITION_SAMPLE_RATE), '-c:a', RECOGNITION_PROFILE['codec']]
+    if RECOGNITION_PROFILE['bitrate']:
+        args += ['-b:a', RECOGNITION_PROFILE['bitrate']]
+    return args
+
+
+def pcm_decode_args(duration: float = None, sample_rate: int = PCM_SAMPLE_RATE) -> list:
+    """ffmpeg output arguments producing raw mono float32 PCM on stdout."""
+    args = ['-t', duration] if duration else []
+    return args + ['-vn', '-ac', '1', '-ar', sample_rate, '-f', 'f32le', 'pipe:1']
+
+
+def _decimate(samples: np.ndarray, factor: int) -> np.ndarray:
+    """Low-pass (windowed sinc) then keep every factor-th sample."""
+    n = np.arange(RESAMPLE_TAPS) - (RESAMPLE_TAPS - 1) / 2
+    cutoff = 0.45 / factor
+    taps = 2 * cutoff * np.sinc(2 * cutoff * n) * np.hamming(RESAMPLE_TAPS)
+    taps = (taps / taps.sum()).astype(np.float32)
+    return np.convolve(samples, taps, mode='same')[::factor].astype(np.float32)
+
+
+class AudioBuffer:
+    """
+    Mono float32 PCM of one clip. The samples array is read-only so stages can
+    share views of it across threads without copying.
+    start is the position of the first sample in the source media, in seconds.
+    """
+
+    def __init__(self, samples: np.ndarray, sample_rate: int = PCM_SAMPLE_RATE, start: float = 0.0):
+        samples = np.asarray(samples, dtype=np.float32)
+        samples.flags.writeable = False
+        self.samples = samples
+        self.sample_rate = sample_rate
+        self.start = start
+        self._resampled = {sample_rate: samples}
+
+    @classmethod
+    def from_pcm(cls, data: bytes, sample_rate: int = PCM_SAMPLE_RATE, start: float = 0.0) -> 'AudioBuffer':
+        """Wrap raw f32le bytes without copying them."""
+        usable = len(data) - len(data) % 4
+        return cls(np.frombuffer(data, dtype=np.float32, count=usable // 4), sample_rate, start)
+
+    @classmethod
+    def decode(cls, file_path: str, start: float = 0, duration: float = None,
+               sample_rate: int = PCM_SAMPLE_RATE, timeout: float = 120, stdin=None) -> 'AudioBuffer | None':
+        """
+        Decode [start, start + duration] of file_path. Returns None when nothing could be decoded.
+        stdin: an open file to decode instead, with file_path 'file:/dev/stdin'.
+        """
+        args = ['-hide_banner', '-loglevel', 'error']
+        if start:
+            args += ['-ss', start]
+        args += ['-i', file_path] + pcm_decode_args(duration=duration, sample_rate=sample_rate)
+
+        result = ffmpeg.run(args, timeout=timeout, stdin=stdin)
+        if result is None or not result.ok or len(result.stdout) < 4:
+            return None
+        return cls.from_pcm(result.stdout, sample_rate, start)
+
+    @property
+    def duration(self) -> float:
+        return len(self.samples) / self.sample_rate
+
+    def window(self, start: float = 0, seconds: float = None) -> np.ndarray:
+        """View of [start, start + seconds] (relative to the buffer)."""
+        first = max(0, int(start * self.sample_rate))
+        last = len(self.samples) if seconds is None else first + int(seconds * self.sample_rate)
+        return self.samples[first:last]
+
+    def slice(self, start: float = 0, seconds: float = None) -> 'AudioBuffer':
+        """A buffer over a window of this one, sharing its samples."""
+        if start <= 0 and seconds is None:
+            return self
+        return AudioBuffer(self.window(start, seconds), self.sample_rate, self.start + start)
+
+    def at_rate(self, sample_rate: int) -> np.ndarray:
+        """The samples at another rate, computed once per rate (e.g. 8 kHz for fingerprinting)."""
+        resampled = self._resampled.get(sample_rate)
+        if resampled is not None:
+            return resampled
+
+        if self.sample_rate % sample_rate == 0:
+            resampled = _decimate(self.samples, self.sample_rate // sample_rate)
+        else:
+            positions = np.arange(int(self.duration * sample_rate)) * (self.sample_rate / sample_rate)
+            resampled = np.interp(positions, np.arange(len(self.samples)), self.samples).astype(np.float32)
+        resampled.flags.writeable = False
+        self._resampled[sample_rate] = resampled
+        return resampled
+
+    def encode(self, out_path: str, encode_args: list, start: float = 0, seconds: float = None,
+               timeout: float = 60) -> str | None:
+        """Encode a window of the buffer to out_path with ffmpeg. Returns out_path or None."""
+        samples = self.window(start, seconds)
+        if len(samples) == 0:
+            return None
+        result = ffmpeg.run(
+            ['-hide_banner', '-loglevel', 'error', '-f', 'f32le', '-ar', self.sample_rate, '-ac', '1', '-i', 'pipe:0']
+            + encode_args + ['-y', out_path],
+            input=memoryview(samples).cast('B'),
+            timeout=timeout,
+        )
+        if result is None or not result.ok:
+            return None
+        return out_path
@@ -0,0 +1,435 @@
+"""
+Accuracy and latency benchmark for the PasteFind local recognizer
+
+    python benchmark.py --sizes 50,200,1000 --queries 40 --output report.json
+    python benchmark.py --compare baseline.json      # exit 1 on an accuracy regression
+
+Query clips are cut from catalog tracks and degraded (noise, pitch and tempo
+shifts, speech overlay, re-encoding with the recognition clip profile), then
+matched against indexes of growing size. Reports recall, wrong matches, the
+false-positive rate on tracks absent from the index and p50/p99 query latency.
+The music detector is scored on clips with and without music: its
+false-negative rate is the share of music clips it would answer "no music".
+
+Runs offline: without --catalog the reference tracks, distractors and speech are
+synthesized from --seed, so two runs on the same code give the same accuracy.
+"""
+import argparse
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from audio_buffer import RECOGNITION_PROFILE, AudioBuffer, recognition_encode_args
+from ffmpeg_runner import ffmpeg
+from fingerprint import FINGERPRINT_PARAMS, SAMPLE_RATE, FingerprintIndex, LocalRecognizer, decode_pcm, fingerprint
+from fingerprint_store import MappedIndex
+from ingest import read_tags, scan_catalog
+from music_presence import MusicDetector
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+logger = logging.getLogger(__name__)
+
+CONDITIONS = ("clean", "noise", "pitch", "tempo", "speech", "reencode")
+NOISE_SNR_DB = 5
+SPEECH_SNR_DB = 0
+PITCH_SHIFT = 1.03    # about half a semitone, tempo preserved
+TEMPO_SHIFT = 1.05
+
+# Music detector cases: name -> whether the clip contains music
+DETECTOR_CASES = {"song": True, "piano": True, "song+speech": True, "speech": False, "noise": False, "silence": False}
+
+
+# ─────────────────────────────────────────────
+# Synthetic audio
+# ─────────────────────────────────────────────
+def synth_track(seed: int, seconds: float) -> np.ndarray:
+    """A deterministic pseudo-song: harmonic notes on a beat grid, kick and hi-hat."""
+    rng = np.random.default_rng(seed)
+    n = int(seconds * SAMPLE_RATE)
+    out = np.zeros(n, dtype=np.float32)
+    beat = 60 / rng.uniform(80, 150)
+    scale = 110 * 2 ** (np.array([0, 2, 3, 5, 7, 8, 10, 12, 14, 15]) / 12) * 2 ** rng.integers(0, 3)
+
+    t = 0.0
+    while t < seconds:
+        length = beat * rng.choice([0.5, 1, 1, 2])
+        start, count = int(t * SAMPLE_RATE), int(length * SAMPLE_RATE)
+        count = min(count, n - start)
+        if count <= 0:
+            break
+        time_axis = np.arange(count) / SAMPLE_RATE
+        envelope = np.exp(-time_axis * rng.uniform(2, 6))
+        for freq in rng.choice(scale, size=rng.integers(1, 4), replace=False):
+            for harmonic in range(1, 5):
+                if freq * harmonic < SAMPLE_RATE / 2:
+                    out[start:start + count] += (envelope * np.sin(2 * np.pi * freq * harmonic * time_axis) / harmonic).astype(np.float32)
+        t += length
+
+    # Drums on the beat grid
+    kick = np.sin(2 * np.pi * 60 * np.arange(int(0.15 * SAMPLE_RATE)) / SAMPLE_RATE) * np.exp(-np.arange(int(0.15 * SAMPLE_RATE)) / 300)
+    hat = rng.standard_normal(int(0.05 * SAMPLE_RATE)) * np.exp(-np.arange(int(0.05 * SAMPLE_RATE)) / 60) * 0.3
+    for i, start in enumerate(np.arange(0, seconds, beat / 2)):
+        s = int(start * SAMPLE_RATE)
+        drum = kick if i % 2 == 0 else hat
+        end = min(n, s + len(drum))
+        out[s:end] += drum[:end - s].astype(np.float32)
+
+    return out / (np.abs(out).max() + 1e-9)
+
+
+def synth_piano(seed: int, seconds: float) -> np.ndarray:
+    """Sparse piano-like notes: short decays at 60-90 BPM played with rubato, no drums."""
+    rng = np.random.default_rng(seed)
+    n = int(seconds * SAMPLE_RATE)
+    out = np.zeros(n, dtype=np.float32)
+    beat = 60 / rng.uniform(60, 90)
+    scale = 220 * 2 ** (np.array([0, 2, 4, 5, 7, 9, 11, 12]) / 12)
+
+    t = 0.0
+    while t < seconds:
+        start = int(t * SAMPLE_RATE)
+        count = min(int(2 * beat * SAMPLE_RATE), n - start)
+        time_axis = np.arange(count) / SAMPLE_RATE
+        envelope = np.exp(-time_axis * rng.uniform(6, 12))
+        freq = rng.choice(scale)
+        for harmonic in range(1, 6):
+            if freq * harmonic < SAMPLE_RATE / 2:
+                out[start:start + count] += (envelope * np.sin(2 * np.pi * freq * harmonic * time_axis) / harmonic ** 2).astype(np.float32)
+        t += beat * rng.uniform(0.85, 1.15)
+
+    return out / (np.abs(out).max() + 1e-9)
+
+
+def synth_speech(seed: int, seconds: float) -> np.ndarray:
+    """Speech-like babble: a jittered voice pitch through changing formants, in syllables and pauses."""
+    rng = np.random.default_rng(seed)
+    n = int(seconds * SAMPLE_RATE)
+    out = np.zeros(n, dtype=np.float32)
+    formants = np.array([[730, 1090], [270, 2290], [300, 870], [530, 1840], [660, 1720]])
+
+    t = 0.0
+    while t < seconds:
+        length = rng.uniform(0.12, 0.3)
+        start, count = int(t * SAMPLE_RATE), min(int(length * SAMPLE_RATE), n - int(t * SAMPLE_RATE))
+        if count <= 0:
+            break
+        time_axis = np.arange(count) / SAMPLE_RATE
+        f0 = rng.uniform(100, 220) * (1 + 0.05 * np.sin(2 * np.pi * rng.uniform(2, 6) * time_axis))
+        phase = 2 * np.pi * np.cumsum(f0) / SAMPLE_RATE
+        f1, f2 = formants[rng.integers(len(formants))]
+        syllable = np.zeros(count)
+        for harmonic in range(1, 30):
+            freq = f0.mean() * harmonic
+            if freq >= SAMPLE_RATE / 2:
+                break
+            gain = np.exp(-((freq - f1) / 120) ** 2) + 0.6 * np.exp(-((freq - f2) / 160) ** 2) + 0.02
+            syllable += gain * np.sin(harmonic * phase)
+        out[start:start + count] = (syllable * np.hanning(count)).astype(np.float32)
+        t += length + (rng.uniform(0.2, 0.6) if rng.random() < 0.2 else rng.uniform(0, 0.05))
+
+    return out / (np.abs(out).max() + 1e-9)
+
+
+def mix(signal: np.ndarray, interference: np.ndarray, snr_db: float) -> np.ndarray:
+    """Add interference to signal at the given signal-to-noise ratio."""
+    signal_power = np.mean(signal ** 2) + 1e-12
+    noise_power = np.mean(interference ** 2) + 1e-12
+    gain = np.sqrt(signal_power / (noise_power * 10 ** (snr_db / 10)))
+    return (signal + gain * interference).astype(np.float32)
+
+
+# ─────────────────────────────────────────────
+# Degradations
+# ─────────────────────────────────────────────
+def ffmpeg_filter(samples: np.ndarray, audio_filter: str) -> np.ndarray | None:
+    """Run samples through an ffmpeg audio filter chain, raw float32 in and out."""
+    result = ffmpeg.run([
+        '-hide_banner', '-loglevel', 'error',
+        '-f', 'f32le', '-ar', SAMPLE_RATE, '-ac', '1', '-i', 'pipe:0',
+        '-af', audio_filter, '-ac', '1', '-ar', SAMPLE_RATE, '-f', 'f32le', 'pipe:1',
+    ], input=samples.astype(np.float32).tobytes(), timeout=60)
+    if result is None or not result.ok:
+        return None
+    return np.frombuffer(result.stdout, dtype=np.float32)
+
+
+def reencode(samples: np.ndarray, work_dir: str) -> np.ndarray | None:
+    """Encode the way the server encodes AudD clips (AudioBuffer.encode + recognition profile) and decode back."""
+    clip_path = os.path.join(work_dir, f"query_clip.{RECOGNITION_PROFILE['ext']}")
+    if not AudioBuffer(samples, SAMPLE_RATE).encode(clip_path, recognition_encode_args()):
+        return None
+    decoded = decode_pcm(clip_path)
+    os.remove(clip_path)
+    return decoded
+
+
+def degrade(clip: np.ndarray, condition: str, rng: np.random.Generator, speech: np.ndarray,
+            work_dir: str) -> np.ndarray | None:
+    if condition == "clean":
+        return clip
+    if condition == "noise":
+        return mix(clip, rng.standard_normal(len(clip)).astype(np.float32), NOISE_SNR_DB)
+    if condition == "pitch":
+        return ffmpeg_filter(clip, f"asetrate={SAMPLE_RATE * PITCH_SHIFT:.0f},aresample={SAMPLE_RATE},atempo={1 / PITCH_SHIFT:.5f}")
+    if condition == "tempo":
+        return ffmpeg_filter(clip, f"atempo={TEMPO_SHIFT}")
+    if condition == "speech":
+        start = rng.integers(0, max(1, len(speech) - len(clip)))
+        overlay = speech[start:start + len(clip)]
+        return mix(clip, np.pad(overlay, (0, len(clip) - len(overlay))), SPEECH_SNR_DB)
+    if condition == "reencode":
+        return reencode(clip, work_dir)
+    raise ValueError(condition)
+
+
+# ─────────────────────────────────────────────
+# Benchmark
+# ─────────────────────────────────────────────
+def load_catalog(args) -> tuple[list, list]:
+    """(metadata, samples) of the reference tracks the queries come from."""
+    if not args.catalog:
+        return (
+            [{"title": f"Synthetic {i}", "subtitle": "Benchmark"} for i in range(args.tracks)],
+            [synth_track(args.seed + i, args.track_seconds) for i in range(args.tracks)],
+        )
+
+    metadata, tracks = [], []
+    for rel_path in scan_catalog(args.catalog)[:args.tracks]:
+        full_path = os.path.join(args.catalog, rel_path)
+        samples = decode_pcm(full_path, duration=args.track_seconds, timeout=600)
+        if samples is not None and len(samples) > args.clip_seconds * SAMPLE_RATE:
+            metadata.append(read_tags(full_path))
+            tracks.append(samples)
+    return metadata, tracks
+
+
+def make_queries(tracks: list, conditions: list, args, speech: np.ndarray, work_dir: str) -> list:
+    """Degraded query clips: (expected track id or None, condition, samples)."""
+    rng = np.random.default_rng(args.seed)
+    clip_len = int(args.clip_seconds * SAMPLE_RATE)
+    sources = [(i, tracks[i]) for i in rng.integers(0, len(tracks), args.queries)]
+    # Negatives: tracks that are never indexed
+    sources += [(None, synth_track(10_000_000 + args.seed + i, args.clip_seconds + 1)) for i in range(args.queries)]
+
+    queries = []
+    for expected, samples in sources:
+        start = rng.integers(0, max(1, len(samples) - clip_len))
+        clip = samples[start:start + clip_len]
+        for condition in conditions:
+            degraded = degrade(clip, condition, rng, speech, work_dir)
+            if degraded is not None and len(degraded):
+                queries.append((expected, condition, degraded))
+    return queries
+
+
+def evaluate(recognizer: LocalRecognizer, queries: list, conditions: list) -> dict:
+    rows = {c: {"positives": 0, "hits": 0, "wrong": 0, "negatives": 0, "false_positives": 0, "latencies": []}
+            for c in conditions}
+    for expected, condition, samples in queries:
+        started = time.perf_counter()
+        candidate = recognizer.match_samples(samples)
+        elapsed = time.perf_counter() - started
+        strong = (
+            candidate is not None
+            and candidate["matches"] >= recognizer.min_matches
+            and candidate["confidence"] >= recognizer.min_confidence
+        )
+
+        row = rows[condition]
+        row["latencies"].append(elapsed)
+        if expected is None:
+            row["negatives"] += 1
+            row["false_positives"] += int(strong)
+        else:
+            row["positives"] += 1
+            if strong:
+                row["hits" if candidate["track_id"] == expected else "wrong"] += 1
+
+    report = {}
+    for condition, row in rows.items():
+        latencies = np.array(row["latencies"]) * 1000
+        report[condition] = {
+            "recall": round(row["hits"] / row["positives"], 4) if row["positives"] else None,
+            "wrong": round(row["wrong"] / row["positives"], 4) if row["positives"] else None,
+            "fpr": round(row["false_positives"] / row["negatives"], 4) if row["negatives"] else None,
+            "p50_ms": round(float(np.percentile(latencies, 50)), 2) if len(latencies) else None,
+            "p99_ms": round(float(np.percentile(latencies, 99)), 2) if len(latencies) else None,
+            "queries": len(latencies),
+        }
+    return report
+
+
+def detector_clip(case: str, seed: int, seconds: float) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    if case == "song":
+        return synth_track(seed, seconds)
+    if case == "piano":
+        return synth_piano(seed, seconds)
+    if case == "song+speech":
+        return mix(synth_track(seed, seconds), synth_speech(seed, seconds), SPEECH_SNR_DB)
+    if case == "speech":
+        return synth_speech(seed, seconds)
+    if case == "noise":
+        return (0.3 * rng.standard_normal(int(seconds * SAMPLE_RATE))).astype(np.float32)
+    if case == "silence":
+        return (1e-4 * rng.standard_normal(int(seconds * SAMPLE_RATE))).astype(np.float32)
+    raise ValueError(case)
+
+
+def evaluate_detector(args) -> dict:
+    """
+    Verdict shares per case: "music" (a window reached min_score), "uncertain"
+    (sent to AudD anyway) and "no_music" (answered without AudD). The
+    false-negative rate is the no_music share over all music clips.
+    """
+    detector = MusicDetector(min_score=args.music_min_score)
+    report, music_clips, false_negatives = {}, 0, 0
+    for case, has_music in DETECTOR_CASES.items():
+        counts = {"music": 0, "uncertain": 0, "no_music": 0}
+        for i in range(args.detector_clips):
+            buffer = AudioBuffer(detector_clip(case, 20_000_000 + args.seed + i, args.detector_seconds), SAMPLE_RATE)
+            verdict = detector.analyze(buffer)
+            counts["music" if verdict["music"] else "no_music" if verdict["no_music"] else "uncertain"] += 1
+        report[case] = {"has_music": has_music, **{k: round(v / args.detector_clips, 4) for k, v in counts.items()}}
+        if has_music:
+            music_clips += args.detector_clips
+            false_negatives += counts["no_music"]
+    return {"false_negative_rate": round(false_negatives / music_clips, 4), "cases": report}
+
+
+def run(args) -> dict:
+    work_dir = tempfile.mkdtemp(prefix='pf-bench-')
+    conditions = [c.strip() for c in args.conditions.split(',') if c.strip()]
+    sizes = sorted(int(s) for s in args.sizes.split(','))
+    try:
+        started = time.perf_counter()
+        metadata, tracks = load_catalog(args)
+        if not tracks:
+            raise SystemExit("No usable catalog tracks")
+        speech = synth_speech(args.seed, 60)
+        queries = make_queries(tracks, conditions, args, speech, work_dir)
+        logger.info(f"[Bench] {len(tracks)} catalog tracks, {len(queries)} queries ready in {time.perf_counter() - started:.1f}s")
+
+        index = FingerprintIndex()
+        for meta, samples in zip(metadata, tracks):
+            index.add_track(meta, *fingerprint(samples))
+
+        results = []
+        distractor = 0
+        for size in sizes:
+            # Grow the index with synthetic distractor tracks up to the target size
+            while len(index.tracks) < size:
+                index.add_track({"title": f"Distractor {distractor}"},
+                                *fingerprint(synth_track(1_000_000 + args.seed + distractor, args.track_seconds)))
+                distractor += 1
+
+            # Query through the memory-mapped format, as the server does
+            index_path = os.path.join(work_dir, f"index-{size}.pfx")
+            index.save(index_path)
+            recognizer = LocalRecognizer(index=MappedIndex(index_path, FINGERPRINT_PARAMS),
+                                         min_matches=args.min_matches, min_confidence=args.min_confidence)
+            report = evaluate(recognizer, queries, conditions)
+            results.append({"tracks": len(index.tracks), "hashes": len(index), "conditions": report})
+            print_table(results[-1])
+
+        detector = evaluate_detector(args)
+        print_detector_table(detector)
+
+        return {
+            "params": {k: getattr(args, k) for k in ("seed", "tracks", "track_seconds", "clip_seconds", "queries",
+                                                   "min_matches", "min_confidence", "music_min_score")},
+            "catalog": args.catalog or "synthetic",
+            "profile": RECOGNITION_PROFILE["codec"],
+            "results": results,
+            "detector": detector,
+        }
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def print_table(result: dict):
+    print(f"\nIndex: {result['tracks']} tracks, {result['hashes']} hashes")
+    print(f"{'condition':<10} {'recall':>7} {'wrong':>7} {'fpr':>7} {'p50 ms':>8} {'p99 ms':>8}")
+    for condition, row in result["conditions"].items():
+        cells = [row[k] if row[k] is not None else float('nan') for k in ("recall", "wrong", "fpr", "p50_ms", "p99_ms")]
+        print(f"{condition:<10} {cells[0]:>7.3f} {cells[1]:>7.3f} {cells[2]:>7.3f} {cells[3]:>8.1f} {cells[4]:>8.1f}")
+
+
+def print_detector_table(detector: dict):
+    print(f"\nMusic detector: false-negative rate {detector['false_negative_rate']:.3f}")
+    print(f"{'case':<12} {'music':>6} {'music':>7} {'unsure':>7} {'no_music':>9}")
+    for case, row in detector["cases"].items():
+        print(f"{case:<12} {'yes' if row['has_music'] else 'no':>6} {row['music']:>7.3f} {row['uncertain']:>7.3f} {row['no_music']:>9.3f}")
+
+
+def compare(report: dict, baseline: dict, tolerance: float) -> list:
+    """Accuracy regressions vs. a baseline report (matched by index size and condition)."""
+    regressions = []
+    previous = {r["tracks"]: r["conditions"] for r in baseline.get("results", [])}
+    for result in report["results"]:
+        for condition, row in result["conditions"].items():
+            old = previous.get(result["tracks"], {}).get(condition)
+            if not old:
+                continue
+            if row["recall"] is not None and old["recall"] is not None and row["recall"] < old["recall"] - tolerance:
+                regressions.append(f"{result['tracks']} tracks / {condition}: recall {old['recall']} -> {row['recall']}")
+            if row["fpr"] is not None and old["fpr"] is not None and row["fpr"] > old["fpr"] + tolerance:
+                regressions.append(f"{result['tracks']} tracks / {condition}: fpr {old['fpr']} -> {row['fpr']}")
+
+    old_fnr = baseline.get("detector", {}).get("false_negative_rate")
+    new_fnr = report["detector"]["false_negative_rate"]
+    if old_fnr is not None and new_fnr > old_fnr + tolerance:
+        regressions.append(f"music detector: false-negative rate {old_fnr} -> {new_fnr}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark local recognition accuracy and latency.")
+    parser.add_argument('--catalog', default=None, help="Folder of reference tracks (default: synthesized tracks)")
+    parser.add_argument('--tracks', type=int, default=30, help="Catalog tracks queries are drawn from")
+    parser.add_argument('--sizes', default='30,200,1000', help="Comma-separated index sizes, in tracks (distractors fill the gap)")
+    parser.add_argument('--track-seconds', type=float, default=60, help="Seconds fingerprinted per track")
+    parser.add_argument('--clip-seconds', type=float, default=10, help="Query clip length")
+    parser.add_argument('--queries', type=int, default=40, help="Positive (and as many negative) clips per condition")
+    parser.add_argument('--conditions', default=','.join(CONDITIONS), help=f"Subset of {','.join(CONDITIONS)}")
+    parser.add_argument('--min-matches', type=int, default=int(os.getenv('LOCAL_MIN_MATCHES', 20)))
+    parser.add_argument('--min-confidence', type=float, default=float(os.getenv('LOCAL_MIN_CONFIDENCE', 0.5)))
+    parser.add_argument('--detector-clips', type=int, default=20, help="Clips per music detector case")
+    parser.add_argument('--detector-seconds', type=float, default=20, help="Music detector clip length")
+    parser.add_argument('--music-min-score', type=float, default=float(os.getenv('MUSIC_MIN_SCORE', 0.3)))
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default=None, help="Write the JSON report here")
+    parser.add_argument('--compare', default=None, help="Baseline JSON report; exit 1 on an accuracy regression")
+    parser.add_argument('--tolerance', type=float, default=0.02, help="Allowed recall drop / FPR rise vs. the baseline")
+    args = parser.parse_args()
+
+    unknown = set(c.strip() for c in args.conditions.split(',')) - set(CONDITIONS)
+    if unknown:
+        parser.error(f"unknown conditions: {', '.join(sorted(unknown))}")
+    logging.getLogger('ffmpeg_runner').setLevel(logging.WARNING)
+    logging.getLogger('fingerprint').setLevel(logging.WARNING)
+    logging.getLogger('fingerprint_store').setLevel(logging.WARNING)
+    logging.getLogger('music_presence').setLevel(logging.WARNING)
+
+    report = run(args)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
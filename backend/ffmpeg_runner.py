@@ -0,0 +1,160 @@
+"""
+ffmpeg / ffprobe runner for PasteFind
+Binaries are resolved once, then invoked with argument lists (no shell).
+"""
+import asyncio
+import logging
+import os
+import shutil
+import subprocess
+import threading
+import time
+from dataclasses import dataclass
+
+logger = logging.getLogger(__name__)
+
+FFMPEG_SEARCH_DIRS = [
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bin'),
+    '/var/www/pastefind-backend/bin',
+    '/usr/bin',
+    '/usr/local/bin',
+]
+
+
+@dataclass
+class FFmpegResult:
+    """Outcome of one ffmpeg/ffprobe invocation."""
+    returncode: int
+    elapsed: float
+    stdout: bytes = b''
+    stderr: bytes = b''
+    timed_out: bool = False
+
+    @property
+    def ok(self) -> bool:
+        return self.returncode == 0 and not self.timed_out
+
+
+class FFmpegRunner:
+    """Resolves ffmpeg/ffprobe once and runs them with timeouts and per-call timing."""
+
+    def __init__(self, default_timeout: float = 120):
+        self.default_timeout = default_timeout
+        self.binaries = {}
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def _locate(self, name: str) -> str | None:
+        override = os.getenv(f'{name.upper()}_PATH')
+        candidates = [override] if override else []
+        candidates += [os.path.join(d, name) for d in FFMPEG_SEARCH_DIRS]
+        candidates.append(shutil.which(name))
+
+        for path in candidates:
+            if not path or not os.access(path, os.X_OK):
+                continue
+            try:
+                proc = subprocess.run([path, '-version'], capture_output=True, timeout=10)
+            except (OSError, subprocess.TimeoutExpired):
+                continue
+            if proc.returncode == 0:
+                return path
+        return None
+
+    def resolve(self):
+        """Locate the binaries. Called once at startup; safe to call again."""
+        for name in ('ffmpeg', 'ffprobe'):
+            path = self._locate(name)
+            self.binaries[name] = path
+            if path:
+                logger.info(f"[ffmpeg] Using {name}: {path}")
+            else:
+                logger.warning(f"[ffmpeg] {name} not found")
+
+    def available(self, binary: str = 'ffmpeg') -> bool:
+        if not self.binaries:
+            self.resolve()
+        return bool(self.binaries.get(binary))
+
+    def command(self, args: list, binary: str = 'ffmpeg') -> list | None:
+        if not self.available(binary):
+            return None
+        return [self.binaries[binary]] + [str(a) for a in args]
+
+    def record(self, binary: str, result: FFmpegResult):
+        with self._lock:
+            stats = self._stats.setdefault(binary, {"calls": 0, "failures": 0, "timeouts": 0, "total_seconds": 0.0})
+            stats["calls"] += 1
+            stats["total_seconds"] += result.elapsed
+            if result.timed_out:
+                stats["timeouts"] += 1
+            elif result.returncode != 0:
+                stats["failures"] += 1
+        level = logging.INFO if result.ok else logging.WARNING
+        logger.log(level, f"[ffmpeg] {binary} exit={result.returncode} in {result.elapsed * 1000:.0f} ms")
+
+    def run(self, args: list, binary: str = 'ffmpeg', timeout: float = None, input: bytes = None,
+            stdin=None) -> FFmpegResult | None:
+        """
+        Run the binary synchronously. Returns None when it is not installed.
+        stdin: an open file handed to the process as-is (read it as file:/dev/stdin to keep it seekable).
+        """
+        cmd = self.command(args, binary)
+        if cmd is None:
+            return None
+
+        started = time.perf_counter()
+        try:
+            proc = subprocess.run(cmd, input=input, stdin=stdin, capture_output=True, timeout=timeout or self.default_timeout)
+            result = FFmpegResult(proc.returncode, time.perf_counter() - started, proc.stdout, proc.stderr)
+        except subprocess.TimeoutExpired as e:
+            result = FFmpegResult(-1, time.perf_counter() - started, e.stdout or b'', e.stderr or b'', timed_out=True)
+        self.record(binary, result)
+        return result
+
+    async def run_async(self, args: list, binary: str = 'ffmpeg', timeout: float = None, input: bytes = None) -> FFmpegResult | None:
+        """Run the binary as an asyncio subprocess. Returns None when it is not installed."""
+        cmd = self.command(args, binary)
+        if cmd is None:
+            return None
+
+        started = time.perf_counter()
+        proc = await asyncio.create_subprocess_exec(
+            *cmd,
+            stdin=asyncio.subprocess.PIPE if input is not None else asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        try:
+            stdout, stderr = await asyncio.wait_for(proc.communicate(input), timeout or self.default_timeout)
+            result = FFmpegResult(proc.returncode, time.perf_counter() - started, stdout, stderr)
+        except asyncio.TimeoutError:
+            proc.kill()
+            await proc.wait()
+            result = FFmpegResult(-1, time.perf_counter() - started, timed_out=True)
+        self.record(binary, result)
+        return result
+
+    async def spawn(self, args: list, binary: str = 'ffmpeg', **kwargs):
+        """Start a long-lived asyncio subprocess (e.g. fed through stdin). Returns None when not installed."""
+        cmd = self.command(args, binary)
+        if cmd is None:
+            return None
+        return await asyncio.create_subprocess_exec(*cmd, **kwargs)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "binaries": dict(self.binaries),
+                **{
+                    binary: {
+                        **s,
+                        "total_seconds": round(s["total_seconds"], 2),
+                        "avg_ms": round(s["total_seconds"] / s["calls"] * 1000, 1) if s["calls"] else 0.0,
+                    }
+                    for binary, s in self._stats.items()
+                },
+            }
+
+
+ffmpeg = FFmpegRunner()
@@ -0,0 +1,618 @@
+"""
+Local audio fingerprinting engine for PasteFind
+Landmark (constellation) fingerprints: STFT -> spectral peaks -> peak-pair hashes,
+matched by voting on the time offset between query and reference.
+"""
+import json
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+
+from audio_buffer import AudioBuffer
+from ffmpeg_runner import ffmpeg
+from fingerprint_store import MappedIndex, lookup_sorted, merge_indexes, tracks_path, write_index
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_RATE = 8000
+FFT_SIZE = 1024
+HOP_SIZE = 256
+FRAMES_PER_SECOND = SAMPLE_RATE / HOP_SIZE
+
+# Peak picking
+PEAK_NEIGHBORHOOD_TIME = 10   # frames on each side
+PEAK_NEIGHBORHOOD_FREQ = 10   # bins on each side
+PEAKS_PER_SECOND = 30
+PEAK_FLOOR_DB = 60            # ignore peaks this far below the loudest bin
+MIN_FREQ_BIN = 3
+
+# Peak pairing: hash = f1 (9 bits) | f2 (9 bits) | dt (8 bits)
+FAN_OUT = 10
+MIN_DT = 1
+MAX_DT = 63
+
+# Stored in index headers: an index built with other parameters cannot be queried
+FINGERPRINT_PARAMS = {
+    "hash_bits": 26, "sample_rate": SAMPLE_RATE, "fft_size": FFT_SIZE, "hop_size": HOP_SIZE, "hash_layout": 1,
+}
+
+
+# ─────────────────────────────────────────────
+# Decoding
+# ─────────────────────────────────────────────
+def decode_pcm(file_path: str, start: float = 0, duration: float = None, timeout: float = 120) -> np.ndarray | None:
+    """Decode file_path to mono float32 samples at SAMPLE_RATE with ffmpeg."""
+    args = ['-hide_banner', '-loglevel', 'error']
+    if start:
+        args += ['-ss', start]
+    args += ['-i', file_path]
+    if duration:
+        args += ['-t', duration]
+    args += ['-vn', '-ac', '1', '-ar', SAMPLE_RATE, '-f', 'f32le', 'pipe:1']
+
+    result = ffmpeg.run(args, timeout=timeout)
+    if result is None or not result.ok:
+        return None
+    return np.frombuffer(result.stdout, dtype=np.float32)
+
+
+# ─────────────────────────────────────────────
+# Fingerprinting
+# ─────────────────────────────────────────────
+def spectrogram(samples: np.ndarray) -> np.ndarray:
+    """Log-magnitude STFT in dB, shape (frames, FFT_SIZE // 2)."""
+    if len(samples) < FFT_SIZE:
+        return np.empty((0, FFT_SIZE // 2), dtype=np.float32)
+    frames = np.lib.stride_tricks.sliding_window_view(samples, FFT_SIZE)[::HOP_SIZE]
+    window = np.hanning(FFT_SIZE).astype(np.float32)
+    magnitude = np.abs(np.fft.rfft(frames * window, axis=1))[:, :FFT_SIZE // 2]
+    return (20 * np.log10(magnitude + 1e-10)).astype(np.float32)
+
+
+def _max_filter(spec: np.ndarray) -> np.ndarray:
+    """Separable 2-D maximum filter over the peak neighborhood."""
+    t, f = PEAK_NEIGHBORHOOD_TIME, PEAK_NEIGHBORHOOD_FREQ
+    padded = np.pad(spec, ((t, t), (0, 0)), constant_values=-np.inf)
+    out = np.lib.stride_tricks.sliding_window_view(padded, 2 * t + 1, axis=0).max(axis=-1)
+    padded = np.pad(out, ((0, 0), (f, f)), constant_values=-np.inf)
+    return np.lib.stride_tricks.sliding_window_view(padded, 2 * f + 1, axis=1).max(axis=-1)
+
+
+def find_peaks(spec: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Local maxima of the spectrogram, thinned to the PEAKS_PER_SECOND strongest
+    per one-second block. Returns (frame_idx, freq_bin) sorted by time then frequency.
+    """
+    if spec.size == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+
+    is_peak = (spec == _max_filter(spec)) & (spec > spec.max() - PEAK_FLOOR_DB)
+    is_peak[:, :MIN_FREQ_BIN] = False
+    times, freqs = np.nonzero(is_peak)
+    if len(times) == 0:
+        return times, freqs
+    strengths = spec[times, freqs]
+
+    # Rank peaks inside each one-second block by strength and keep the top ones
+    block = (times // int(FRAMES_PER_SECOND)).astype(np.int64)
+    order = np.lexsort((-strengths, block))
+    block_sorted = block[order]
+    first_in_block = np.searchsorted(block_sorted, block_sorted, side='left')
+    rank = np.arange(len(order)) - first_in_block
+    keep = order[rank < PEAKS_PER_SECOND]
+
+    times, freqs = times[keep], freqs[keep]
+    order = np.lexsort((freqs, times))
+    return times[order], freqs[order]
+
+
+def hash_peaks(times: np.ndarray, freqs: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Pair each anchor peak with its next FAN_OUT peaks. Returns (hashes, anchor_frames)."""
+    hashes, offsets = [], []
+    for k in range(1, FAN_OUT + 1):
+        if len(times) <= k:
+            break
+        t1, t2 = times[:-k], times[k:]
+        f1, f2 = freqs[:-k], freqs[k:]
+        dt = t2 - t1
+        valid = (dt >= MIN_DT) & (dt <= MAX_DT)
+        hashes.append(
+            (f1[valid].astype(np.uint32) << 17)
+            | (f2[valid].astype(np.uint32) << 8)
+            | dt[valid].astype(np.uint32)
+        )
+        offsets.append(t1[valid].astype(np.uint32))
+
+    if not hashes:
+        return np.empty(0, dtype=np.uint32), np.empty(0, dtype=np.uint32)
+    return np.concatenate(hashes), np.concatenate(offsets)
+
+
+def fingerprint(samples: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Samples at SAMPLE_RATE -> (hashes uint32, frame offsets uint32)."""
+    return hash_peaks(*find_peaks(spectrogram(np.asarray(samples, dtype=np.float32))))
+
+
+# ─────────────────────────────────────────────
+# Index
+# ─────────────────────────────────────────────
+class FingerprintIndex:
+    """
+    In-memory reference index: parallel arrays of hashes, track ids and offsets,
+    kept sorted by hash for vectorized lookup. Track metadata lives in self.tracks.
+    Used to build indexes; serving uses fingerprint_store.MappedIndex.
+    """
+
+    def __init__(self):
+        self.tracks = []
+        empty = np.empty(0, dtype=np.uint32)
+        self._arrays = (empty, empty, empty)  # swapped as a whole so readers see a consistent triple
+        self._pending = []
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._arrays[0]) + sum(len(p[0]) for p in self._pending)
+
+    def add_track(self, metadata: dict, hashes: np.ndarray, offsets: np.ndarray) -> int:
+        """Register a reference track and its fingerprints. Returns its track id."""
+        with self._lock:
+            track_id = len(self.tracks)
+            self.tracks.append(metadata)
+            self._pending.append((hashes, np.full(len(hashes), track_id, dtype=np.uint32), offsets))
+            return track_id
+
+    def _merge_pending(self):
+        with self._lock:
+            if not self._pending:
+                return
+            pending, self._pending = self._pending, []
+            current = self._arrays
+            hashes = np.concatenate([current[0]] + [p[0] for p in pending])
+            track_ids = np.concatenate([current[1]] + [p[1] for p in pending])
+            offsets = np.concatenate([current[2]] + [p[2] for p in pending])
+            order = np.argsort(hashes, kind='stable')
+            self._arrays = (hashes[order], track_ids[order], offsets[order])
+
+    def lookup(self, hashes: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Find every reference entry for the query hashes.
+        Returns (query_positions, track_ids, reference_offsets).
+        """
+        self._merge_pending()
+        return lookup_sorted(*self._arrays, hashes)
+
+    def arrays(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Hash-sorted (hashes, track_ids, offsets)."""
+        self._merge_pending()
+        return self._arrays
+
+    def save(self, path: str):
+        """Write the index in the memory-mapped on-disk format."""
+        write_index(path, *self.arrays(), self.tracks, FINGERPRINT_PARAMS)
+
+
+# ─────────────────────────────────────────────
+# Segmented (LSM) index
+# ─────────────────────────────────────────────
+class SegmentedIndex:
+    """
+    Incrementally growing index: a memory-mapped base, immutable on-disk segments
+    and an in-memory memtable that takes new tracks and is queryable at once.
+
+    A background compactor flushes the memtable into a new segment and merges
+    segments into a new base file. Each change publishes a new tuple of layers
+    (one attribute assignment), so queries keep using the generation they
+    started with and never wait for a flush or a merge. Track ids are global and
+    stable: base tracks first, then each segment's, then the memtable's.
+
+    On disk, <path>.manifest.json names the live base and segments; it is replaced
+    atomically after the new files are written, then the superseded ones deleted.
+    With path=None the index stays in memory.
+    """
+
+    def __init__(self, path: str = None, params: dict = FINGERPRINT_PARAMS, flush_tracks: int = 20,
+                 compact_segments: int = 8, flush_interval: float = 300):
+        self.path = path
+        self.params = params
+        self.flush_tracks = flush_tracks
+        self.compact_segments = compact_segments
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()         # layer swaps and memtable inserts
+        self._write_lock = threading.Lock()   # one flush/compaction at a time
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._base = None          # (file name, MappedIndex)
+        self._segments = []        # [(file name, MappedIndex)]
+        self._frozen = []          # memtables being written out, still queried
+        self._active = FingerprintIndex()
+        self._next_id = 0
+        self._generation = 0
+        self._counters = {"flushes": 0, "compactions": 0}
+        if path:
+            self._open()
+        self._publish()
+
+    # Files live next to path and are named <basename>.<kind>-<n>
+    @property
+    def manifest_path(self) -> str:
+        return f"{self.path}.manifest.json"
+
+    def _file(self, name: str) -> str:
+        return os.path.join(os.path.dirname(os.path.abspath(self.path)), name)
+
+    def _new_name(self, kind: str) -> str:
+        self._next_id += 1
+        return f"{os.path.basename(self.path)}.{kind}-{self._next_id:06d}"
+
+    def _open(self):
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+            base = manifest.get("base")
+            self._base = (base, MappedIndex(self._file(base), self.params)) if base else None
+            self._segments = [(name, MappedIndex(self._file(name), self.params)) for name in manifest.get("segments", [])]
+            self._next_id = manifest.get("next_id", 0)
+            self._generation = manifest.get("generation", 0)
+            self._remove_orphans()
+        elif os.path.exists(self.path):
+            # Plain index written by an older version: adopt it as the base
+            self._base = (os.path.basename(self.path), MappedIndex(self.path, self.params))
+
+    def _remove_orphans(self):
+        """Delete files left by a flush or compaction interrupted before its manifest swap."""
+        live = {name for name, _ in ([self._base] if self._base else []) + self._segments}
+        prefix = f"{os.path.basename(self.path)}."
+        for name in os.listdir(os.path.dirname(os.path.abspath(self.path))):
+            stem = name[:-len('.tracks.json')] if name.endswith('.tracks.json') else name
+            if stem.startswith(prefix) and stem[len(prefix):].split('-')[0] in ("seg", "base") and stem not in live:
+                self._remove_files(stem)
+
+    def _remove_files(self, name: str):
+        for file_path in (self._file(name), tracks_path(self._file(name))):
+            try:
+                os.remove(file_path)
+            except FileNotFoundError:
+                pass
+
+    def _write_manifest(self):
+        manifest = {
+            "base": self._base[0] if self._base else None,
+            "segments": [name for name, _ in self._segments],
+            "next_id": self._next_id,
+            "generation": self._generation,
+        }
+        tmp = f"{self.manifest_path}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.manifest_path)
+
+    def _publish(self):
+        """Swap in the current layers. Caller holds self._lock (or is __init__)."""
+        layers = ([self._base[1]] if self._base else []) + [s for _, s in self._segments] + self._frozen
+        self._active_offset = sum(len(layer.tracks) for layer in layers)
+        self._layers = tuple(layers) + (self._active,)
+
+    # ── Reads ──────────────────────────────────
+    @property
+    def track_count(self) -> int:
+        layers = self._layers
+        return sum(len(layer.tracks) for layer in layers)
+
+    def __len__(self) -> int:
+        return sum(len(layer) for layer in self._layers)
+
+    def track(self, track_id: int) -> dict:
+        for layer in self._layers:
+            if track_id < len(layer.tracks):
+                return layer.tracks[track_id]
+            track_id -= len(layer.tracks)
+        raise IndexError(track_id)
+
+    def lookup(self, hashes: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Same contract as FingerprintIndex.lookup, over every layer of one generation."""
+        layers = self._layers
+        parts, first_id = [], 0
+        for layer in layers:
+            positions, track_ids, offsets = layer.lookup(hashes)
+            if len(positions):
+                parts.append((positions, track_ids.astype(np.uint32) + np.uint32(first_id), offsets))
+            first_id += len(layer.tracks)
+        if not parts:
+            empty = np.empty(0, dtype=np.int64)
+            return empty, empty.astype(np.uint32), empty.astype(np.uint32)
+        if len(parts) == 1:
+            return parts[0]
+        return tuple(np.concatenate([p[i] for p in parts]) for i in range(3))
+
+    # ── Writes ─────────────────────────────────
+    def add_track(self, metadata: dict, hashes: np.ndarray, offsets: np.ndarray) -> int:
+        """Insert into the memtable; queryable immediately. Returns the global track id."""
+        with self._lock:
+            track_id = self._active_offset + self._active.add_track(metadata, hashes, offsets)
+            full = len(self._active.tracks) >= self.flush_tracks
+        if full:
+            self._wake.set()
+        return track_id
+
+    def flush(self):
+        """Write the memtable out as a new segment."""
+        if not self.path:
+            return
+        with self._write_lock:
+            with self._lock:
+                memtable = self._active
+                if not memtable.tracks:
+                    return
+                self._frozen = [memtable]
+                self._active = FingerprintIndex()
+                self._publish()
+
+            name = self._new_name("seg")
+            memtable.save(self._file(name))
+            segment = MappedIndex(self._file(name), self.params)
+            with self._lock:
+                self._segments = self._segments + [(name, segment)]
+                self._frozen = []
+                self._generation += 1
+                self._publish()
+            self._write_manifest()
+            self._counters["flushes"] += 1
+
+    def compact(self):
+        """Merge the base and all segments into a new base file."""
+        if not self.path:
+            return
+        with self._write_lock:
+            old = ([self._base] if self._base else []) + self._segments
+            if len(old) < 2:
+                return
+            started = time.perf_counter()
+            name = self._new_name("base")
+            merge_indexes(self._file(name), [index for _, index in old], self.params)
+            base = (name, MappedIndex(self._file(name), self.params))
+            with self._lock:
+                self._base = base
+                self._segments = []
+                self._generation += 1
+                self._publish()
+            self._write_manifest()
+            self._counters["compactions"] += 1
+
+            # In-flight queries keep their mappings; unlinking does not affect them
+            for old_name, _ in old:
+                self._remove_files(old_name)
+            logger.info(f"[Index] Compacted {len(old)} files into {name} in {time.perf_counter() - started:.2f}s")
+
+    # ── Background compaction ──────────────────
+    def _compactor(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+                if len(self._segments) >= self.compact_segments:
+                    self.compact()
+            except Exception as e:
+                logger.error(f"[Index] Background compaction failed: {e}")
+
+    def start(self):
+        if self.path and self._thread is None:
+            self._thread = threading.Thread(target=self._compactor, name="pf-compactor", daemon=True)
+            self._thread.start()
+
+    def close(self):
+        """Stop the compactor and flush what is left in the memtable."""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                **self._counters,
+                "generation": self._generation,
+                "segments": len(self._segments),
+                "memtable_tracks": len(self._active.tracks),
+            }
+
+
+# ─────────────────────────────────────────────
+# Matching
+# ─────────────────────────────────────────────
+def vote(query_offsets: np.ndarray, query_positions: np.ndarray,
+         track_ids: np.ndarray, ref_offsets: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Offset-histogram voting: a true match has many hashes agreeing on the same
+    (track, reference_offset - query_offset). Returns the sorted bin keys
+    (track << 32 | biased delta) and their vote counts.
+    """
+    deltas = ref_offsets.astype(np.int64) - query_offsets[query_positions].astype(np.int64)
+    keys = (track_ids.astype(np.int64) << 32) | (deltas + (1 << 31))
+    return np.unique(keys, return_counts=True)
+
+
+def merge_votes(*votes: tuple[np.ndarray, np.ndarray]) -> tuple[np.ndarray, np.ndarray]:
+    """Sum vote histograms computed over disjoint parts of the index."""
+    votes = [v for v in votes if len(v[0])]
+    if not votes:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    if len(votes) == 1:
+        return votes[0]
+    bins, inverse = np.unique(np.concatenate([v[0] for v in votes]), return_inverse=True)
+    counts = np.bincount(inverse, weights=np.concatenate([v[1] for v in votes]), minlength=len(bins))
+    return bins, counts.astype(np.int64)
+
+
+def best_candidate(bins: np.ndarray, counts: np.ndarray) -> dict | None:
+    """Best and runner-up bins of a vote histogram."""
+    if len(bins) == 0:
+        return None
+
+    best = int(np.argmax(counts))
+    best_track = int(bins[best] >> 32)
+    best_delta = int((bins[best] & 0xFFFFFFFF) - (1 << 31))
+
+    # Runner-up among other tracks, to measure how clearly the best one wins
+    other = (bins >> 32) != best_track
+    runner_up = int(counts[other].max()) if other.any() else 0
+
+    return {
+        "track_id": best_track,
+        "matches": int(counts[best]),
+        "runner_up": runner_up,
+        "offset_seconds": round(best_delta / FRAMES_PER_SECOND, 2),
+    }
+
+
+class LocalRecognizer:
+    """
+    First-tier recognizer answering from the local index.
+    A match is accepted only if it has enough aligned hashes and clearly beats
+    the next best track; otherwise callers fall back to AudD.
+
+    Besides the read-only catalog index, it keeps a SegmentedIndex of clips
+    learned from AudD matches (see learn_buffer), queried together with the catalog.
+    """
+
+    def __init__(self, index: FingerprintIndex = None, min_matches: int = 20,
+                 min_confidence: float = 0.5, learned_flush_tracks: int = 20,
+                 learned_compact_segments: int = 8):
+        self.index = index or FingerprintIndex()
+        self.learned = SegmentedIndex()
+        self.learned_flush_tracks = learned_flush_tracks
+        self.learned_compact_segments = learned_compact_segments
+        self.min_matches = min_matches
+        self.min_confidence = min_confidence
+        self._lock = threading.Lock()
+        self._counters = {"queries": 0, "hits": 0, "weak": 0, "learned": 0}
+
+    @property
+    def ready(self) -> bool:
+        return len(self.index.tracks) + self.learned.track_count > 0
+
+    def load(self, path: str):
+        if not path or not os.path.exists(path):
+            logger.info(f"[Local] No fingerprint index at {path}")
+            return
+        try:
+            self.index = MappedIndex(path, FINGERPRINT_PARAMS)
+        except (OSError, ValueError) as e:
+            logger.error(f"[Local] Cannot open fingerprint index {path}: {e}")
+            return
+        logger.info(f"[Local] Loaded {len(self.index.tracks)} tracks, {len(self.index)} hashes from {path}")
+
+    def load_learned(self, path: str):
+        """Open the learned store at path (restoring earlier clips) and start its compactor."""
+        try:
+            learned = SegmentedIndex(path, FINGERPRINT_PARAMS, flush_tracks=self.learned_flush_tracks,
+                                     compact_segments=self.learned_compact_segments)
+        except (OSError, ValueError) as e:
+            logger.error(f"[Local] Cannot open learned index {path}: {e}")
+            return
+        self.learned = learned
+        self.learned.start()
+        logger.info(f"[Local] Loaded {self.learned.track_count} learned clips from {path}")
+
+    def close_learned(self):
+        """Stop background compaction and persist pending learned clips."""
+        self.learned.close()
+
+    def _votes(self, hashes: np.ndarray, offsets: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Vote histogram over the catalog and the learned index; learned track ids
+        follow the catalog ones. A catalog index with a vote() method (such as
+        fingerprint_shards.ShardedIndex) scores its entries itself.
+        """
+        if hasattr(self.index, 'vote'):
+            votes = self.index.vote(hashes, offsets)
+        else:
+            votes = vote(offsets, *self.index.lookup(hashes))
+        if self.learned.track_count == 0:
+            return votes
+        positions, track_ids, ref_offsets = self.learned.lookup(hashes)
+        learned = vote(offsets, positions, track_ids + np.uint32(len(self.index.tracks)), ref_offsets)
+        return merge_votes(votes, learned)
+
+    def _track(self, track_id: int) -> dict:
+        base = len(self.index.tracks)
+        return self.index.tracks[track_id] if track_id < base else self.learned.track(track_id - base)
+
+    def match_samples(self, samples: np.ndarray) -> dict | None:
+        """Best candidate for samples with its confidence, whether or not it is strong."""
+        hashes, offsets = fingerprint(samples)
+        if len(hashes) == 0:
+            return None
+        candidate = best_candidate(*self._votes(hashes, offsets))
+        if candidate is None:
+            return None
+
+        # Confidence: share of the aligned votes the winner holds vs. the runner-up,
+        # scaled down when the absolute number of aligned hashes is small
+        margin = 1 - candidate["runner_up"] / candidate["matches"]
+        support = min(1.0, candidate["matches"] / (2 * self.min_matches))
+        candidate["confidence"] = round(margin * support, 3)
+        return candidate
+
+    def recognize_samples(self, samples: np.ndarray) -> dict | None:
+        """Return an API-shaped result for a strong local match, else None."""
+        candidate = self.match_samples(samples)
+        with self._lock:
+            self._counters["queries"] += 1
+            strong = (
+                candidate is not None
+                and candidate["matches"] >= self.min_matches
+                and candidate["confidence"] >= self.min_confidence
+            )
+            self._counters["hits" if strong else "weak"] += 1
+        if not strong:
+            if candidate:
+                logger.info(f"[Local] Weak match: {candidate}")
+            return None
+
+        logger.info(f"[Local] Match: {candidate}")
+        return {
+            **self._track(candidate["track_id"]),
+            "service": "local",
+            "confidence": candidate["confidence"],
+        }
+
+    def recognize_buffer(self, buffer: AudioBuffer) -> dict | None:
+        """Recognize an already decoded clip (blocking)."""
+        if not self.ready or len(buffer.samples) == 0:
+            return None
+        return self.recognize_samples(buffer.at_rate(SAMPLE_RATE))
+
+    def learn_samples(self, samples: np.ndarray, metadata: dict) -> int | None:
+        """Add a labelled clip to the learned index. Returns its track id."""
+        hashes, offsets = fingerprint(samples)
+        if len(hashes) < self.min_matches:
+            return None
+        track_id = self.learned.add_track(metadata, hashes, offsets)
+        with self._lock:
+            self._counters["learned"] += 1
+        logger.info(f"[Local] Learned '{metadata.get('title')}' ({len(hashes)} hashes)")
+        return track_id
+
+    def learn_buffer(self, buffer: AudioBuffer, metadata: dict) -> int | None:
+        """Learn an already decoded clip under metadata (blocking)."""
+        return self.learn_samples(buffer.at_rate(SAMPLE_RATE), metadata)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                **self._counters,
+                "tracks": len(self.index.tracks),
+                "hashes": len(self.index),
+                "learned_tracks": self.learned.track_count,
+                "learned_store": self.learned.stats(),
+                **({"shards": self.index.stats()} if hasattr(self.index, 'stats') else {}),
+            }
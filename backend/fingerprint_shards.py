@@ -0,0 +1,115 @@
+"""
+Multi-process sharded matching for the PasteFind local fingerprint index
+The catalog index is split into hash ranges scored in parallel by worker
+processes, so offset-histogram voting is not serialized by the GIL.
+"""
+import logging
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+
+from fingerprint import merge_votes, vote
+from fingerprint_store import MappedIndex
+
+logger = logging.getLogger(__name__)
+
+# Worker-process state: each worker maps the index file once. Pages are shared
+# through the OS page cache, and a worker only touches the ranges it is sent.
+_WORKER_INDEX = None
+
+
+def _open_worker_index(path: str, params: dict):
+    global _WORKER_INDEX
+    _WORKER_INDEX = MappedIndex(path, params)
+
+
+def _vote_shard(hashes: np.ndarray, offsets: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Worker: vote histogram of the query hashes that fall in one shard."""
+    return vote(offsets, *_WORKER_INDEX.lookup(hashes))
+
+
+def _warm_up() -> bool:
+    return _WORKER_INDEX is not None
+
+
+class ShardedIndex:
+    """
+    Wraps a MappedIndex and scores queries across worker processes.
+    Shards are contiguous hash ranges holding about the same number of entries;
+    a query's hashes are scattered to their shards, each shard returns its
+    partial vote histogram and the histograms are summed (merge_votes).
+    Falls back to in-process scoring if the pool breaks.
+    """
+
+    def __init__(self, index: MappedIndex, shards: int):
+        self.index = index
+        self.shards = shards
+        # Split at entry quantiles rather than equal hash ranges: hash values are not uniform
+        cuts = [int(index.hashes[len(index) * i // shards]) for i in range(1, shards)] if len(index) else []
+        self.boundaries = np.array(cuts, dtype=np.uint64)
+        self._lock = threading.Lock()
+        self._queries = 0
+        self._fallbacks = 0
+        self._scatter_seconds = 0.0
+        # spawn: forking a process that already runs server threads is not safe
+        self._pool = ProcessPoolExecutor(
+            max_workers=shards,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_open_worker_index,
+            initargs=(index.path, index.params),
+        )
+        for future in [self._pool.submit(_warm_up) for _ in range(shards)]:
+            future.result()
+        logger.info(f"[Local] Sharded {len(index)} hashes across {shards} worker processes")
+
+    @property
+    def tracks(self) -> list:
+        return self.index.tracks
+
+    @property
+    def path(self) -> str:
+        return self.index.path
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def lookup(self, hashes: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        return self.index.lookup(hashes)
+
+    def vote(self, hashes: np.ndarray, offsets: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Scatter the query over the shards and merge their vote histograms."""
+        started = time.perf_counter()
+        shard_of = np.searchsorted(self.boundaries, hashes.astype(np.uint64), side='right')
+        order = np.argsort(shard_of, kind='stable')
+        splits = np.searchsorted(shard_of[order], np.arange(1, self.shards))
+        parts = [(h, o) for h, o in zip(np.split(hashes[order], splits), np.split(offsets[order], splits)) if len(h)]
+
+        try:
+            futures = [self._pool.submit(_vote_shard, h, o) for h, o in parts]
+            votes = merge_votes(*(f.result() for f in futures))
+        except BrokenProcessPool:
+            logger.error("[Local] Shard worker died, scoring in-process")
+            with self._lock:
+                self._fallbacks += 1
+            votes = vote(offsets, *self.index.lookup(hashes))
+
+        with self._lock:
+            self._queries += 1
+            self._scatter_seconds += time.perf_counter() - started
+        return votes
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "shards": self.shards,
+                "queries": self._queries,
+                "fallbacks": self._fallbacks,
+                "avg_ms": round(1000 * self._scatter_seconds / self._queries, 2) if self._queries else 0.0,
+            }
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
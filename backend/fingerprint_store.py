@@ -0,0 +1,274 @@
+"""
+On-disk fingerprint index format for PasteFind
+
+One file, opened with mmap so every uvicorn worker shares the same page-cache copy:
+
+    header   64 bytes   magic, format version, counts and fingerprint parameters
+    buckets  u64[2^bucket_bits + 1]   start of each hash-prefix bucket in the entry arrays
+    hashes   u32[n]     sorted ascending
+    tracks   u32[n]     track id of each entry
+    offsets  u32[n]     frame offset of each entry in its track
+
+Track metadata (title, artist, links...) lives in a JSON sidecar: <index>.tracks.json
+"""
+import json
+import logging
+import mmap
+import os
+import struct
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'PFFP'
+FORMAT_VERSION = 1
+HEADER_SIZE = 64
+HEADER = struct.Struct('<4sIIQIIIIIII')
+BUCKET_BITS = 16
+
+# Hashes shared by more than this many reference entries carry no information
+MAX_HASH_OCCURRENCES = 2000
+
+PARAM_FIELDS = ('hash_bits', 'sample_rate', 'fft_size', 'hop_size', 'hash_layout')
+
+
+def tracks_path(path: str) -> str:
+    return f"{path}.tracks.json"
+
+
+def _aligned(size: int) -> int:
+    return (size + 7) & ~7
+
+
+# ─────────────────────────────────────────────
+# Lookup helpers shared by in-memory and mapped indexes
+# ─────────────────────────────────────────────
+def expand_ranges(left: np.ndarray, right: np.ndarray, ref_track_ids: np.ndarray,
+                  ref_offsets: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Turn per-query [left, right) ranges of a hash-sorted reference into flat
+    (query_positions, track_ids, reference_offsets) arrays.
+    """
+    empty = np.empty(0, dtype=np.int64)
+    counts = (right - left).astype(np.int64)
+    counts[counts > MAX_HASH_OCCURRENCES] = 0
+    total = int(counts.sum())
+    if total == 0:
+        return empty, empty.astype(np.uint32), empty.astype(np.uint32)
+
+    query_positions = np.repeat(np.arange(len(left)), counts)
+    run_starts = np.repeat(np.cumsum(counts) - counts, counts)
+    positions = np.repeat(left.astype(np.int64), counts) + (np.arange(total) - run_starts)
+    return query_positions, np.asarray(ref_track_ids[positions]), np.asarray(ref_offsets[positions])
+
+
+def lookup_sorted(ref_hashes: np.ndarray, ref_track_ids: np.ndarray, ref_offsets: np.ndarray,
+                  hashes: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Vectorized multi-key lookup in hash-sorted reference arrays."""
+    left = np.searchsorted(ref_hashes, hashes, side='left')
+    right = np.searchsorted(ref_hashes, hashes, side='right')
+    return expand_ranges(left, right, ref_track_ids, ref_offsets)
+
+
+def _bisect(ref_hashes: np.ndarray, hashes: np.ndarray, lo: np.ndarray, hi: np.ndarray,
+            right: bool) -> np.ndarray:
+    """Vectorized binary search of each query inside its own [lo, hi) range."""
+    lo, hi = lo.copy(), hi.copy()
+    active = np.nonzero(lo < hi)[0]
+    while len(active):
+        mid = (lo[active] + hi[active]) // 2
+        values = ref_hashes[mid]
+        goes_right = values <= hashes[active] if right else values < hashes[active]
+        lo[active] = np.where(goes_right, mid + 1, lo[active])
+        hi[active] = np.where(goes_right, hi[active], mid)
+        active = active[lo[active] < hi[active]]
+    return lo
+
+
+# ─────────────────────────────────────────────
+# Writer
+# ─────────────────────────────────────────────
+def write_index(path: str, hashes: np.ndarray, track_ids: np.ndarray, offsets: np.ndarray,
+                tracks: list, params: dict, bucket_bits: int = BUCKET_BITS):
+    """
+    Write a complete index atomically (temp file + rename), sorting entries by hash
+    if needed. The sidecar is replaced first so a reader never sees track ids
+    without metadata.
+    """
+    hashes = np.ascontiguousarray(hashes, dtype=np.uint32)
+    track_ids = np.ascontiguousarray(track_ids, dtype=np.uint32)
+    offsets = np.ascontiguousarray(offsets, dtype=np.uint32)
+    if len(hashes) > 1 and np.any(hashes[1:] < hashes[:-1]):
+        order = np.argsort(hashes, kind='stable')
+        hashes, track_ids, offsets = hashes[order], track_ids[order], offsets[order]
+
+    shift = params['hash_bits'] - bucket_bits
+    prefixes = np.arange((1 << bucket_bits) + 1, dtype=np.uint64) << np.uint64(shift)
+    buckets = np.searchsorted(hashes, prefixes, side='left').astype(np.uint64)
+
+    _write_sidecar(path, tracks)
+
+    header = HEADER.pack(
+        MAGIC, FORMAT_VERSION, HEADER_SIZE, len(hashes), len(tracks), bucket_bits,
+        *(int(params[k]) for k in PARAM_FIELDS),
+    )
+    tmp = f"{path}.tmp"
+    with open(tmp, 'wb') as f:
+        f.write(header.ljust(HEADER_SIZE, b'\0'))
+        for section in (buckets, hashes, track_ids, offsets):
+            data = section.tobytes()
+            f.write(data)
+            f.write(b'\0' * (_aligned(len(data)) - len(data)))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    logger.info(f"[Index] Wrote {len(hashes)} hashes, {len(tracks)} tracks to {path}")
+
+
+def _write_sidecar(path: str, tracks: list):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    sidecar_tmp = f"{tracks_path(path)}.tmp"
+    with open(sidecar_tmp, 'w', encoding='utf-8') as f:
+        json.dump(tracks, f, ensure_ascii=False)
+    os.replace(sidecar_tmp, tracks_path(path))
+
+
+def merge_indexes(path: str, sources: list, params: dict, ranges: int = 64,
+                  bucket_bits: int = BUCKET_BITS):
+    """
+    Merge several hash-sorted indexes (MappedIndex shards) into one file.
+    Track ids are renumbered by concatenating the sources' tracks in order.
+    The output is filled one hash range at a time through np.memmap, so peak
+    memory is about 1/ranges of the total entries rather than all of them.
+    """
+    total = sum(len(src.hashes) for src in sources)
+    tracks, bases = [], []
+    for src in sources:
+        bases.append(len(tracks))
+        tracks.extend(src.tracks)
+
+    _write_sidecar(path, tracks)
+
+    n_buckets = (1 << bucket_bits) + 1
+    layout = [HEADER_SIZE]
+    for nbytes in (n_buckets * 8, total * 4, total * 4, total * 4):
+        layout.append(layout[-1] + _aligned(nbytes))
+
+    tmp = f"{path}.tmp"
+    with open(tmp, 'wb') as f:
+        header = HEADER.pack(
+            MAGIC, FORMAT_VERSION, HEADER_SIZE, total, len(tracks), bucket_bits,
+            *(int(params[k]) for k in PARAM_FIELDS),
+        )
+        f.write(header.ljust(HEADER_SIZE, b'\0'))
+        f.truncate(layout[-1])
+
+    out_hashes = np.memmap(tmp, dtype=np.uint32, mode='r+', offset=layout[1], shape=(total,)) if total else np.empty(0, np.uint32)
+    out_tracks = np.memmap(tmp, dtype=np.uint32, mode='r+', offset=layout[2], shape=(total,)) if total else np.empty(0, np.uint32)
+    out_offsets = np.memmap(tmp, dtype=np.uint32, mode='r+', offset=layout[3], shape=(total,)) if total else np.empty(0, np.uint32)
+
+    boundaries = np.linspace(0, 1 << params['hash_bits'], ranges + 1).astype(np.uint64)
+    cursor = 0
+    for lo, hi in zip(boundaries[:-1], boundaries[1:]):
+        parts = []
+        for src, base in zip(sources, bases):
+            start, stop = np.searchsorted(src.hashes, [lo, hi], side='left')
+            if stop > start:
+                parts.append((
+                    src.hashes[start:stop],
+                    src.track_ids[start:stop].astype(np.uint32) + np.uint32(base),
+                    src.offsets[start:stop],
+                ))
+        if not parts:
+            continue
+        hashes = np.concatenate([p[0] for p in parts])
+        order = np.argsort(hashes, kind='stable')
+        end = cursor + len(hashes)
+        out_hashes[cursor:end] = hashes[order]
+        out_tracks[cursor:end] = np.concatenate([p[1] for p in parts])[order]
+        out_offsets[cursor:end] = np.concatenate([p[2] for p in parts])[order]
+        cursor = end
+
+    shift = params['hash_bits'] - bucket_bits
+    prefixes = np.arange(n_buckets, dtype=np.uint64) << np.uint64(shift)
+    buckets = np.memmap(tmp, dtype=np.uint64, mode='r+', offset=layout[0], shape=(n_buckets,))
+    buckets[:] = np.searchsorted(out_hashes, prefixes, side='left')
+
+    for array in (buckets, out_hashes, out_tracks, out_offsets):
+        if isinstance(array, np.memmap):
+            array.flush()
+    del buckets, out_hashes, out_tracks, out_offsets
+    with open(tmp, 'rb+') as f:
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    logger.info(f"[Index] Merged {len(sources)} sources: {total} hashes, {len(tracks)} tracks -> {path}")
+
+
+# ─────────────────────────────────────────────
+# Reader
+# ─────────────────────────────────────────────
+class MappedIndex:
+    """
+    Read-only, memory-mapped index. Opening costs one header read and the
+    sidecar parse; entry pages are loaded lazily by the OS and shared between
+    processes mapping the same file.
+    """
+
+    def __init__(self, path: str, expected_params: dict = None):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if len(self._mmap) < HEADER_SIZE:
+            raise ValueError("truncated index header")
+        fields = HEADER.unpack_from(self._mmap, 0)
+        magic, version, header_size, entry_count, track_count, bucket_bits = fields[:6]
+        if magic != MAGIC:
+            raise ValueError("not a PasteFind fingerprint index")
+        if version != FORMAT_VERSION:
+            raise ValueError(f"unsupported index version {version}")
+
+        self.params = dict(zip(PARAM_FIELDS, fields[6:]))
+        if expected_params:
+            mismatched = {k: self.params[k] for k in PARAM_FIELDS if self.params[k] != expected_params.get(k)}
+            if mismatched:
+                raise ValueError(f"index built with different fingerprint parameters: {mismatched}")
+
+        self.bucket_bits = bucket_bits
+        self._shift = self.params['hash_bits'] - bucket_bits
+        n = entry_count
+        offset = header_size
+        self.buckets = np.frombuffer(self._mmap, dtype=np.uint64, count=(1 << bucket_bits) + 1, offset=offset)
+        offset += _aligned(self.buckets.nbytes)
+        self.hashes = np.frombuffer(self._mmap, dtype=np.uint32, count=n, offset=offset)
+        offset += _aligned(n * 4)
+        self.track_ids = np.frombuffer(self._mmap, dtype=np.uint32, count=n, offset=offset)
+        offset += _aligned(n * 4)
+        self.offsets = np.frombuffer(self._mmap, dtype=np.uint32, count=n, offset=offset)
+
+        with open(tracks_path(path), 'r', encoding='utf-8') as f:
+            self.tracks = json.load(f)
+        if len(self.tracks) < track_count:
+            raise ValueError("track sidecar is older than the index")
+
+    def __len__(self) -> int:
+        return len(self.hashes)
+
+    def ranges(self, hashes: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """[left, right) entry range of each query hash: bucket table, then binary search inside the bucket."""
+        hashes = np.asarray(hashes, dtype=np.uint32)
+        prefix = (hashes >> np.uint32(self._shift)).astype(np.int64)
+        prefix = np.minimum(prefix, (1 << self.bucket_bits) - 1)
+        lo = self.buckets[prefix].astype(np.int64)
+        hi = self.buckets[prefix + 1].astype(np.int64)
+        left = _bisect(self.hashes, hashes, lo, hi, right=False)
+        right = _bisect(self.hashes, hashes, left, hi, right=True)
+        return left, right
+
+    def lookup(self, hashes: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Same contract as FingerprintIndex.lookup."""
+        if len(self.hashes) == 0 or len(hashes) == 0:
+            empty = np.empty(0, dtype=np.int64)
+            return empty, empty.astype(np.uint32), empty.astype(np.uint32)
+        return expand_ranges(*self.ranges(hashes), self.track_ids, self.offsets)
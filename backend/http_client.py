@@ -0,0 +1,97 @@
+"""
+Shared pooled HTTP client for PasteFind outbound calls (AudD, YouTube Data API, RapidAPI)
+Keeps connections alive between requests and retries transient failures with backoff.
+"""
+import logging
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+
+class UploadSafeRetry(Retry):
+    """
+    Retry policy that never re-sends a POST the server may already have processed
+    (an AudD upload is a paid call): POST is retried only on connect errors and on
+    429 with Retry-After. Idempotent methods also retry read errors and 5xx.
+    """
+
+    def is_retry(self, method: str, status_code: int, has_retry_after: bool = False) -> bool:
+        if method.upper() == 'POST':
+            return status_code == 429 and has_retry_after and self.respect_retry_after_header
+        return super().is_retry(method, status_code, has_retry_after)
+
+
+class PooledHTTPClient:
+    """requests.Session with a sized keep-alive pool, a retry policy and usage counters."""
+
+    def __init__(self, pool_size: int = 20, retries: int = 2, backoff: float = 0.5):
+        self.pool_size = pool_size
+        # Read errors are retried for Retry.DEFAULT_ALLOWED_METHODS only, which excludes POST
+        retry = UploadSafeRetry(
+            total=retries,
+            connect=retries,
+            read=retries,
+            status=retries,
+            backoff_factor=backoff,
+            status_forcelist=(429, 500, 502, 503, 504),
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        self._adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount('https://', self._adapter)
+        self.session.mount('http://', self._adapter)
+        self._lock = threading.Lock()
+        self._requests = 0
+        self._errors = 0
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        with self._lock:
+            self._requests += 1
+        try:
+            return self.session.request(method, url, **kwargs)
+        except requests.RequestException:
+            with self._lock:
+                self._errors += 1
+            raise
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request('POST', url, **kwargs)
+
+    def stats(self) -> dict:
+        """Requests sent vs TCP connections opened, per host."""
+        hosts = {}
+        pools = self._adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            connections = getattr(pool, 'num_connections', 0)
+            sent = getattr(pool, 'num_requests', 0)
+            hosts[pool.host] = {
+                "requests": sent,
+                "connections": connections,
+                "reused": max(sent - connections, 0),
+            }
+        with self._lock:
+            return {
+                "pool_size": self.pool_size,
+                "requests": self._requests,
+                "errors": self._errors,
+                "hosts": hosts,
+            }
+
+
+http = PooledHTTPClient(
+    pool_size=int(os.getenv('HTTP_POOL_SIZE', 20)),
+    retries=int(os.getenv('HTTP_RETRIES', 2)),
+    backoff=float(os.getenv('HTTP_BACKOFF', 0.5)),
+)
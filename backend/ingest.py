@@ -0,0 +1,188 @@
+"""
+Bulk catalog ingestion for the PasteFind local fingerprint index
+
+    python ingest.py /path/to/catalog --output data/fingerprints.pfx --workers 8
+
+Reference tracks are decoded with ffmpeg and fingerprinted across a process pool.
+Each batch becomes a shard (a small index in the same on-disk format) recorded in
+a checkpoint, so an interrupted run resumes where it stopped. Shards are merged
+into the final index at the end.
+"""
+import argparse
+import json
+import logging
+import os
+import shutil
+import time
+import urllib.parse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from ffmpeg_runner import ffmpeg
+from fingerprint import FINGERPRINT_PARAMS, FingerprintIndex, decode_pcm, fingerprint
+from fingerprint_store import MappedIndex, merge_indexes
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+logger = logging.getLogger(__name__)
+
+AUDIO_EXTENSIONS = {"mp3", "flac", "wav", "m4a", "ogg", "opus", "aac", "webm", "mp4"}
+CHECKPOINT_FILE = 'checkpoint.json'
+DECODE_TIMEOUT = 600  # long mixes decode slowly on small instances
+
+
+def track_metadata(title: str, artist: str) -> dict:
+    """API-shaped track metadata with search links, like the AudD fallbacks."""
+    query = urllib.parse.quote(f"{title} {artist}")
+    return {
+        "title": title,
+        "subtitle": artist,
+        "image": '',
+        "spotify_url": f"https://open.spotify.com/search/{query}",
+        "youtube_url": f"https://www.youtube.com/results?search_query={query}",
+        "apple_music": f"https://music.apple.com/search?term={query}",
+    }
+
+
+def read_tags(file_path: str) -> dict:
+    """Title/artist from the file tags, falling back to an 'Artist - Title' file name."""
+    tags = {}
+    result = ffmpeg.run(['-v', 'error', '-show_entries', 'format_tags=title,artist', '-of', 'json', file_path],
+                        binary='ffprobe', timeout=20)
+    if result is not None and result.ok:
+        try:
+            raw = json.loads(result.stdout).get('format', {}).get('tags', {})
+            tags = {k.lower(): v for k, v in raw.items()}
+        except ValueError:
+            pass
+
+    if tags.get('title') and tags.get('artist'):
+        return track_metadata(tags['title'], tags['artist'])
+
+    stem = os.path.splitext(os.path.basename(file_path))[0]
+    if ' - ' in stem:
+        artist, title = stem.split(' - ', 1)
+        return track_metadata(title.strip(), artist.strip())
+    return track_metadata(tags.get('title') or stem, tags.get('artist') or 'Unknown Artist')
+
+
+def fingerprint_batch(catalog_dir: str, files: list, shard_path: str, max_seconds: float) -> dict:
+    """Worker: fingerprint a batch of files into one shard index."""
+    index = FingerprintIndex()
+    done, failed = [], []
+    for rel_path in files:
+        full_path = os.path.join(catalog_dir, rel_path)
+        samples = decode_pcm(full_path, duration=max_seconds, timeout=DECODE_TIMEOUT)
+        if samples is None or len(samples) == 0:
+            failed.append(rel_path)
+            continue
+        hashes, offsets = fingerprint(samples)
+        index.add_track(read_tags(full_path), hashes, offsets)
+        done.append(rel_path)
+
+    index.save(shard_path)
+    return {"shard": shard_path, "files": done, "failed": failed, "hashes": len(index)}
+
+
+def scan_catalog(catalog_dir: str) -> list:
+    files = []
+    for root, _, names in os.walk(catalog_dir):
+        for name in names:
+            if name.rsplit('.', 1)[-1].lower() in AUDIO_EXTENSIONS:
+                files.append(os.path.relpath(os.path.join(root, name), catalog_dir))
+    return sorted(files)
+
+
+def load_checkpoint(work_dir: str) -> dict:
+    path = os.path.join(work_dir, CHECKPOINT_FILE)
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    return {"shards": [], "failed": []}
+
+
+def save_checkpoint(work_dir: str, checkpoint: dict):
+    path = os.path.join(work_dir, CHECKPOINT_FILE)
+    with open(f"{path}.tmp", 'w', encoding='utf-8') as f:
+        json.dump(checkpoint, f)
+    os.replace(f"{path}.tmp", path)
+
+
+def ingest(catalog_dir: str, output: str, work_dir: str, workers: int, batch_size: int,
+           max_seconds: float, keep_work: bool):
+    os.makedirs(work_dir, exist_ok=True)
+    checkpoint = load_checkpoint(work_dir)
+    processed = {f for shard in checkpoint["shards"] for f in shard["files"]} | set(checkpoint["failed"])
+
+    files = scan_catalog(catalog_dir)
+    pending = [f for f in files if f not in processed]
+    logger.info(f"[Ingest] {len(files)} files in catalog, {len(processed)} already processed, {len(pending)} to go")
+
+    batches = [pending[i:i + batch_size] for i in range(0, len(pending), batch_size)]
+    run_id = int(time.time())
+    started = time.perf_counter()
+    tracks_done = 0
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(fingerprint_batch, catalog_dir, batch,
+                        os.path.join(work_dir, f"shard-{run_id}-{i:05d}.pfx"), max_seconds)
+            for i, batch in enumerate(batches)
+        ]
+        for future in as_completed(futures):
+            shard = future.result()
+            checkpoint["shards"].append({"path": shard["shard"], "files": shard["files"]})
+            checkpoint["failed"].extend(shard["failed"])
+            save_checkpoint(work_dir, checkpoint)
+
+            tracks_done += len(shard["files"]) + len(shard["failed"])
+            elapsed = time.perf_counter() - started
+            rate = tracks_done / elapsed if elapsed else 0.0
+            eta = (len(pending) - tracks_done) / rate if rate else 0.0
+            logger.info(
+                f"[Ingest] {tracks_done}/{len(pending)} tracks, {rate:.1f} tracks/s, "
+                f"ETA {eta:.0f}s ({len(shard['failed'])} failed in last batch)"
+            )
+
+    shards = [MappedIndex(s["path"], FINGERPRINT_PARAMS) for s in checkpoint["shards"]]
+    merge_started = time.perf_counter()
+    merge_indexes(output, shards, FINGERPRINT_PARAMS)
+    logger.info(f"[Ingest] Merged {len(shards)} shards in {time.perf_counter() - merge_started:.1f}s")
+
+    total = time.perf_counter() - started
+    logger.info(
+        f"[Ingest] Done: {sum(len(s['files']) for s in checkpoint['shards'])} tracks indexed, "
+        f"{len(checkpoint['failed'])} failed, {total:.1f}s total"
+    )
+
+    if not keep_work:
+        del shards
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fingerprint a folder of reference tracks into the local index.")
+    parser.add_argument('catalog', help="Folder of reference audio files (scanned recursively)")
+    parser.add_argument('--output', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'fingerprints.pfx'),
+                        help="Index file to write (default: backend/data/fingerprints.pfx)")
+    parser.add_argument('--work-dir', default=None, help="Shard and checkpoint folder (default: <output>.work)")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 2, help="Fingerprinting processes")
+    parser.add_argument('--batch-size', type=int, default=100, help="Tracks per shard / checkpoint step")
+    parser.add_argument('--max-seconds', type=float, default=None, help="Only fingerprint the first N seconds of each track")
+    parser.add_argument('--keep-work', action='store_true', help="Keep shards and checkpoint after merging")
+    args = parser.parse_args()
+
+    # One line per ffmpeg call is too chatty for tens of thousands of tracks
+    logging.getLogger('ffmpeg_runner').setLevel(logging.WARNING)
+
+    ingest(
+        catalog_dir=args.catalog,
+        output=args.output,
+        work_dir=args.work_dir or f"{args.output}.work",
+        workers=max(1, args.workers),
+        batch_size=max(1, args.batch_size),
+        max_seconds=args.max_seconds,
+        keep_work=args.keep_work,
+    )
+
+
+if __name__ == "__main__":
+    main()
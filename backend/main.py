@@ -1,6 +1,6 @@
 from fastapi import FastAPI, UploadFile, File, Form, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, HTMLResponse, FileResponse
+from fastapi.responses import JSONResponse, HTMLResponse, FileResponse, StreamingResponse
 from pydantic import BaseModel
 import yt_dlp
 import asyncio
@@ -8,28 +8,79 @@ import logging
 import os
 import uuid
 import json
+import hashlib
 import urllib.parse
-import requests
 import re
 import time
+from contextlib import asynccontextmanager
+
+from audd_client import AudDClient
+from audio_buffer import PCM_SAMPLE_RATE, RECOGNITION_PROFILE, AudioBuffer, pcm_decode_args, recognition_encode_args
+from ffmpeg_runner import FFmpegResult, ffmpeg
+from fingerprint import LocalRecognizer
+from fingerprint_shards import ShardedIndex
+from http_client import http
+from music_presence import MusicDetector
+from segment_selector import SegmentSelector
+from timeline import format_timestamp, merge_windows, window_starts
+from upload_limit import UploadSizeLimit
+from result_cache import ResultCache
+from workers import PoolBusyError, SingleFlight, run_stage, pools_have_capacity, pool_stats, shutdown_pools
+from youtube_functions import extract_youtube_id, identify_music_from_youtube_metadata
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="PasteFind API", version="3.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    ffmpeg.resolve()
+    local_recognizer.load(LOCAL_INDEX_PATH)
+    if LOCAL_SHARDS > 1 and len(local_recognizer.index) >= LOCAL_SHARD_MIN_HASHES:
+        local_recognizer.index = ShardedIndex(local_recognizer.index, LOCAL_SHARDS)
+    local_recognizer.load_learned(LEARNED_INDEX_PATH)
+    yield
+    shutdown_pools()
+    local_recognizer.close_learned()
+    if isinstance(local_recognizer.index, ShardedIndex):
+        local_recognizer.index.shutdown()
+
+app = FastAPI(title="PasteFind API", version="3.0", lifespan=lifespan)
 
 # AudD.io Configuration
 AUDD_API_TOKEN = os.getenv('AUDD_API_TOKEN', '')
-AUDD_API_URL = 'https://api.audd.io/'
+audd = AudDClient(AUDD_API_TOKEN)
+
+# Local fingerprint index, queried before AudD
+LOCAL_INDEX_PATH = os.getenv('LOCAL_INDEX_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'fingerprints.pfx'))
+local_recognizer = LocalRecognizer(
+    min_matches=int(os.getenv('LOCAL_MIN_MATCHES', 20)),
+    min_confidence=float(os.getenv('LOCAL_MIN_CONFIDENCE', 0.5)),
+    learned_flush_tracks=int(os.getenv('LEARNED_FLUSH_TRACKS', 20)),
+    learned_compact_segments=int(os.getenv('LEARNED_COMPACT_SEGMENTS', 8)),
+)
 
-# CORS - allow all origins
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+# Large catalogs are scored across worker processes (one hash-range shard each)
+LOCAL_SHARDS = int(os.getenv('LOCAL_SHARDS', os.cpu_count() or 1))
+LOCAL_SHARD_MIN_HASHES = int(os.getenv('LOCAL_SHARD_MIN_HASHES', 5_000_000))
+
+# Clips without music (talking, silence) are answered before reaching AudD
+MUSIC_DETECTION = os.getenv('MUSIC_DETECTION', '1') == '1'
+music_detector = MusicDetector(min_score=float(os.getenv('MUSIC_MIN_SCORE', 0.3)))
+segment_selector = SegmentSelector(music_detector)
+
+# AudD matches are fingerprinted into a learned index so repeats resolve locally
+LOCAL_LEARNING = os.getenv('LOCAL_LEARNING', '1') == '1'
+LEARNED_INDEX_PATH = os.getenv('LEARNED_INDEX_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'learned.pfx'))
+LEARNED_FIELDS = ("title", "subtitle", "image", "spotify_url", "youtube_url", "apple_music")
+learning_tasks = set()
+
+# Recognition result cache (set RESULT_CACHE_DB to a file path to persist across restarts)
+result_cache = ResultCache(
+    max_entries=int(os.getenv('RESULT_CACHE_SIZE', 1000)),
+    ttl=float(os.getenv('RESULT_CACHE_TTL', 7 * 86400)),
+    negative_ttl=float(os.getenv('RESULT_CACHE_NEGATIVE_TTL', 3600)),
+    db_path=os.getenv('RESULT_CACHE_DB') or None,
 )
 
 # Static files directory (root of project)
@@ -39,6 +90,70 @@ HTML_FILE = os.path.join(STATIC_DIR, 'index.html')
 class VideoURL(BaseModel):
     url: str
 
+# Uploads are streamed to disk in chunks; anything over the cutoff is aborted
+UPLOAD_CHUNK_SIZE = int(os.getenv('UPLOAD_CHUNK_SIZE', 1024 * 1024))
+UPLOAD_MAX_MB = int(os.getenv('UPLOAD_MAX_MB', 200))
+UPLOAD_MAX_BYTES = UPLOAD_MAX_MB * 1024 * 1024
+
+# Seconds of audio sent for recognition
+CLIP_SECONDS = int(os.getenv('CLIP_SECONDS', 30))
+
+# Recognition mode: "single" sends the best CLIP_SECONDS window; "parallel" sends the
+# PARALLEL_WINDOWS best PARALLEL_WINDOW_SECONDS windows at once and keeps the first match;
+# "progressive" walks PROGRESSIVE_SCHEDULE, trying the next step only on no_match
+RECOGNITION_MODE = os.getenv('RECOGNITION_MODE', 'single')
+PARALLEL_WINDOWS = int(os.getenv('PARALLEL_WINDOWS', 3))
+PARALLEL_WINDOW_SECONDS = int(os.getenv('PARALLEL_WINDOW_SECONDS', 12))
+window_stats = {"parallel_requests": 0, "misses": 0, "hits_by_window": [0] * PARALLEL_WINDOWS}
+
+def parse_schedule(text: str) -> list:
+    """"10,20@10,30" -> [(10.0, 0.0), (20.0, 10.0), (30.0, 0.0)]: clip seconds @ offset from the chosen window."""
+    steps = []
+    for step in filter(None, (part.strip() for part in text.split(','))):
+        seconds, _, offset = step.partition('@')
+        steps.append((float(seconds), float(offset or 0)))
+    return steps or [(float(CLIP_SECONDS), 0.0)]
+
+PROGRESSIVE_SCHEDULE = parse_schedule(os.getenv('PROGRESSIVE_SCHEDULE', '10,20,30'))
+progressive_stats = {"requests": 0, "misses": 0, "hits_by_step": [0] * len(PROGRESSIVE_SCHEDULE)}
+
+# Seconds of audio decoded to choose the CLIP_SECONDS window from
+ANALYSIS_SECONDS = max(CLIP_SECONDS, int(os.getenv('ANALYSIS_SECONDS', 60)))
+
+# Timeline mode (/api/timeline): the whole media is recognized in overlapping windows
+TIMELINE_WINDOW_SECONDS = int(os.getenv('TIMELINE_WINDOW_SECONDS', 20))
+TIMELINE_HOP_SECONDS = int(os.getenv('TIMELINE_HOP_SECONDS', 15))
+TIMELINE_CONCURRENCY = int(os.getenv('TIMELINE_CONCURRENCY', 4))
+TIMELINE_MAX_SECONDS = int(os.getenv('TIMELINE_MAX_SECONDS', 3 * 3600))
+
+# Links whose page metadata already names the track (YouTube Music, TikTok sounds,
+# official videos) are answered from yt-dlp's info_dict without downloading audio
+METADATA_FAST_PATH = os.getenv('METADATA_FAST_PATH', '1') == '1'
+# TikTok videos reusing one sound share its recognition, keyed by the sound asset
+TIKTOK_SOUND_CACHE = os.getenv('TIKTOK_SOUND_CACHE', '1') == '1'
+metadata_stats = {"checked": 0, "hits": 0, "sound_hits": 0}
+
+# Partial downloads: only fetch [DOWNLOAD_WINDOW_START, +ANALYSIS_SECONDS] of the media
+PARTIAL_DOWNLOAD = os.getenv('PARTIAL_DOWNLOAD', '1') != '0'
+DOWNLOAD_WINDOW_START = float(os.getenv('DOWNLOAD_WINDOW_START', 0))
+
+BUSY_RESPONSE = {"error": "⏳ Le serveur est très sollicité. Réessayez dans quelques instants."}
+TOO_LARGE_RESPONSE = {"error": f"❌ Fichier trop volumineux (maximum {UPLOAD_MAX_MB} Mo)."}
+
+# Multipart uploads are cut off on the raw body, before the framework spools them
+# (the allowance covers multipart boundaries and headers)
+app.add_middleware(UploadSizeLimit, max_bytes=UPLOAD_MAX_BYTES + 64 * 1024,
+                   paths=("/api/upload",), response=TOO_LARGE_RESPONSE)
+
+# CORS - allow all origins (added last so it also wraps the upload limit's 413)
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+
 # ─────────────────────────────────────────────
 # HELPER: Clean tracking params from URL
 # ─────────────────────────────────────────────
@@ -59,112 +174,59 @@ def clean_url(url: str) -> str:
         return url
 
 # ─────────────────────────────────────────────
-# HELPER: Analyze audio with AudD.io
+# HELPER: Canonical cache key for a media URL
 # ─────────────────────────────────────────────
-def analyze_with_audd(file_path: str) -> dict:
-    """Send audio file to AudD.io API for music recognition."""
-    if not AUDD_API_TOKEN:
-        logger.warning("[AudD] No API token configured")
-        return {"error": "API token not configured"}
-
-    try:
-        logger.info(f"[AudD] Analyzing: {file_path}")
-        file_size = os.path.getsize(file_path)
-        logger.info(f"[AudD] File size: {file_size} bytes")
-
-        with open(file_path, 'rb') as f:
-            files = {'file': f}
-            data = {
-                'api_token': AUDD_API_TOKEN,
-                'return': 'apple_music,spotify,deezer'
-            }
-            response = requests.post(AUDD_API_URL, files=files, data=data, timeout=60)
-            result = response.json()
-
-        logger.info(f"[AudD] Status: {result.get('status')}")
-
-        if result.get('status') != 'success':
-            error_msg = result.get('error', {})
-            if isinstance(error_msg, dict):
-                error_msg = error_msg.get('error_message', 'Unknown error')
-            return {"error": f"AudD error: {error_msg}"}
-
-        if result.get('result') is None:
-            return {"error": "no_match"}
-
-        music = result['result']
-        title = music.get('title', 'Unknown Title')
-        artist = music.get('artist', 'Unknown Artist')
-
-        # --- Cover art (priority: Spotify > Apple Music > Deezer) ---
-        image = ''
-        spotify_data = music.get('spotify') or {}
-        if spotify_data and 'album' in spotify_data:
-            images = spotify_data['album'].get('images', [])
-            if images:
-                image = images[0].get('url', '')
-
-        if not image:
-            apple_data = music.get('apple_music') or {}
-            artwork = apple_data.get('artwork', {})
-            if artwork:
-                url_template = artwork.get('url', '')
-                if url_template:
-                    image = url_template.replace('{w}', '600').replace('{h}', '600')
-
-        if not image:
-            deezer_data = music.get('deezer') or {}
-            album_data = deezer_data.get('album') or {}
-            image = album_data.get('cover_xl', '') or album_data.get('cover_big', '')
-
-        # --- External links ---
-        spotify_url = ''
-        apple_music_url = ''
-
-        if spotify_data:
-            ext_urls = spotify_data.get('external_urls', {})
-            spotify_url = ext_urls.get('spotify', '')
-
-        apple_data = music.get('apple_music') or {}
-        if apple_data:
-            apple_music_url = apple_data.get('url', '')
-
-        # YouTube search fallback
-        query = urllib.parse.quote(f"{title} {artist}")
-        youtube_url = f"https://www.youtube.com/results?search_query={query}"
-
-        if not spotify_url:
-            spotify_url = f"https://open.spotify.com/search/{query}"
-
-        if not apple_music_url:
-            apple_music_url = f"https://music.apple.com/search?term={query}"
-
-        return {
-            "title": title,
-            "subtitle": artist,
-            "image": image,
-            "spotify_url": spotify_url,
-            "youtube_url": youtube_url,
-            "apple_music": apple_music_url,
-            "service": "audd"
-        }
-
-    except requests.exceptions.Timeout:
-        logger.error("[AudD] Timeout")
-        return {"error": "AudD timeout"}
-    except Exception as e:
-        logger.error(f"[AudD] Exception: {e}")
-        return {"error": str(e)}
+MEDIA_ID_PATTERNS = [
+    ('tiktok', r'tiktok\.com/(?:@[^/]+/video|v|embed(?:/v2)?)/(\d+)'),
+    ('facebook', r'facebook\.com/(?:[^/]+/)?(?:reel|videos)/(?:[^/]+/)?(\d+)'),
+    ('facebook', r'facebook\.com/watch/?\?(?:.*&)?v=(\d+)'),
+    ('instagram', r'instagram\.com/(?:[^/]+/)?(?:reel|reels|p|tv)/([A-Za-z0-9_-]+)'),
+]
+
+def media_cache_key(url: str) -> str:
+    """Return 'platform:video_id' when the URL carries a known ID, else the cleaned URL."""
+    youtube_id = extract_youtube_id(url)
+    if youtube_id:
+        return f"youtube:{youtube_id}"
+
+    for platform, pattern in MEDIA_ID_PATTERNS:
+        match = re.search(pattern, url)
+        if match:
+            return f"{platform}:{match.group(1)}"
+
+    return f"url:{clean_url(url)}"
+
+def tiktok_sound(info: dict | None) -> dict | None:
+    """
+    {"key": "tiktok-sound:<id>", "format_id": music-only format} for a TikTok
+    info_dict, or None. yt-dlp does not expose the music ID, but the sound
+    asset's CDN object name is the same for every video using that sound.
+    """
+    if not info or info.get('extractor_key') != 'TikTok':
+        return None
+    for fmt in info.get('formats') or []:
+        if fmt.get('vcodec') == 'none' and fmt.get('url'):
+            name = urllib.parse.urlparse(fmt['url']).path.rstrip('/').rsplit('/', 1)[-1]
+            sound_id = os.path.splitext(name)[0]
+            if sound_id:
+                return {"key": f"tiktok-sound:{sound_id}", "format_id": fmt.get('format_id')}
+    return None
 
 # ─────────────────────────────────────────────
 # HELPER: Download audio with yt-dlp
 # ─────────────────────────────────────────────
-def download_audio(url: str) -> str | None:
-    """Download audio from URL using yt-dlp. Returns path to MP3 file."""
-    temp_dir = "/tmp"
-    output_id = str(uuid.uuid4())
-    output_template = f"{temp_dir}/{output_id}.%(ext)s"
-
+def find_download(temp_dir: str, output_id: str) -> str | None:
+    """Locate the file yt-dlp produced for output_id."""
+    for f in os.listdir(temp_dir):
+        if f.startswith(output_id) and not f.endswith(('.part', '.ytdl')):
+            full_path = f"{temp_dir}/{f}"
+            logger.info(f"[yt-dlp] Downloaded: {full_path} ({os.path.getsize(full_path)} bytes)")
+            return full_path
+
+    return None
+
+def ydl_options(url: str, output_template: str = None) -> dict:
+    """yt-dlp options for url, with the platform-specific format and headers."""
     # Detect platform
     is_facebook = 'facebook.com' in url or 'fb.watch' in url or 'fb.com' in url
     is_instagram = 'instagram.com' in url
@@ -173,19 +235,12 @@ def download_audio(url: str) -> str | None:
 
     ydl_opts = {
         'format': 'bestaudio/best',
-        'outtmpl': output_template,
         'quiet': True,
         'no_warnings': True,
         'extract_flat': False,
         'retries': 3,
         'fragment_retries': 3,
         'nocheckcertificate': True,
-        'postprocessors': [{
-            'key': 'FFmpegExtractAudio',
-            'preferredcodec': 'mp3',
-            'preferredquality': '128',
-        }],
-        'postprocessor_args': ['-t', '30'],  # Only first 30 seconds
     }
 
     # Platform-specific headers
@@ -208,23 +263,80 @@ def download_audio(url: str) -> str | None:
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
         }
 
+    if output_template:
+        ydl_opts['outtmpl'] = output_template
+    return ydl_opts
+
+def extract_media_info(url: str) -> dict | None:
+    """One page fetch: the yt-dlp info_dict of url without downloading, or None."""
     try:
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            logger.info(f"[yt-dlp] Downloading: {url}")
-            ydl.download([url])
+        with yt_dlp.YoutubeDL(ydl_options(url)) as ydl:
+            logger.info(f"[yt-dlp] Extracting info: {url}")
+            return ydl.extract_info(url, download=False)
+    except Exception as e:
+        logger.warning(f"[yt-dlp] Info extraction failed: {e}")
+        return None
+
+def ydl_fetch(ydl: yt_dlp.YoutubeDL, info: dict):
+    """Download from an info_dict from extract_media_info instead of scraping the page again."""
+    # Same route as yt-dlp's --load-info-json
+    ydl.process_ie_result(yt_dlp.YoutubeDL.sanitize_info(info, remove_private_keys=True), download=True)
+
+def download_audio(url: str, start: float = DOWNLOAD_WINDOW_START, duration: float | None = ANALYSIS_SECONDS,
+                   info: dict | None = None, audio_format: str | None = None) -> tuple[str, float] | None:
+    """
+    Download audio from URL using yt-dlp. Returns (path to the audio file in
+    its source codec, offset of start in that file); the transcode stage
+    decodes from the offset. With PARTIAL_DOWNLOAD, only the
+    [start, start + duration] window is fetched (offset 0); otherwise, or
+    when that fails, the whole media is (offset start). duration=None
+    downloads the whole media. info: an info_dict already
+    extracted for url (extract_media_info). audio_format: a format_id tried
+    before the platform default (e.g. a TikTok music-only asset).
+    The page is extracted once: a dead, private or geo-blocked link fails
+    here, and only a failed section download falls back to a full one.
+    """
+    if info is None:
+        info = extract_media_info(url)
+        if info is None:
+            return None
 
-        # Find the output file
-        mp3_path = f"{temp_dir}/{output_id}.mp3"
-        if os.path.exists(mp3_path):
-            logger.info(f"[yt-dlp] Downloaded: {mp3_path} ({os.path.getsize(mp3_path)} bytes)")
-            return mp3_path
+    temp_dir = "/tmp"
+    output_id = str(uuid.uuid4())
+    ydl_opts = ydl_options(url, f"{temp_dir}/{output_id}.%(ext)s")
+    if audio_format:
+        ydl_opts['format'] = f"{audio_format}/{ydl_opts['format']}"
+
+    # Fetch only the needed time window: yt-dlp hands the section to ffmpeg,
+    # which seeks via range requests / skips fragments outside the window
+    if PARTIAL_DOWNLOAD and duration:
+        section_opts = dict(ydl_opts)
+        section_opts['download_ranges'] = yt_dlp.utils.download_range_func(None, [(start, start + duration)])
+        try:
+            with yt_dlp.YoutubeDL(section_opts) as ydl:
+                logger.info(f"[yt-dlp] Downloading {start:g}-{start + duration:g}s: {url}")
+                ydl_fetch(ydl, info)
+
+            path = find_download(temp_dir, output_id)
+            if path:
+                return path, 0.0
+            logger.warning("[yt-dlp] Partial download produced no file, retrying in full")
+        except Exception as e:
+            logger.warning(f"[yt-dlp] Partial download failed ({e}), retrying in full")
 
-        # Search for any file with our ID
         for f in os.listdir(temp_dir):
             if f.startswith(output_id):
-                full_path = f"{temp_dir}/{f}"
-                logger.info(f"[yt-dlp] Found file: {full_path}")
-                return full_path
+                cleanup_files(f"{temp_dir}/{f}")
+
+    try:
+        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            logger.info(f"[yt-dlp] Downloading: {url}")
+            ydl_fetch(ydl, info)
+
+        path = find_download(temp_dir, output_id)
+        if path:
+            # Full media was fetched: the window is decoded from start
+            return path, start
 
         logger.error("[yt-dlp] No output file found")
         return None
@@ -234,38 +346,277 @@ def download_audio(url: str) -> str | None:
         return None
 
 # ─────────────────────────────────────────────
-# HELPER: Truncate large files for AudD
+# HELPER: Probe and decode downloaded media
+# ─────────────────────────────────────────────
+def probe_audio(file_path: str) -> dict | None:
+    """Return the codec and duration of the first audio stream, or None."""
+    proc = ffmpeg.run([
+        '-v', 'error', '-select_streams', 'a:0',
+        '-show_entries', 'stream=codec_name:format=duration',
+        '-of', 'json', file_path
+    ], binary='ffprobe', timeout=20)
+    if proc is None or not proc.ok:
+        return None
+    try:
+        info = json.loads(proc.stdout)
+        streams = info.get('streams') or [{}]
+        return {
+            "codec": streams[0].get('codec_name'),
+            "duration": float(info.get('format', {}).get('duration') or 0),
+        }
+    except (ValueError, KeyError):
+        return None
+
+def decode_spool(spool) -> AudioBuffer | None:
+    """Decode the first ANALYSIS_SECONDS of an upload's spooled temp file in place, without copying it."""
+    spool.seek(0)
+    spool.fileno()  # rolls a small in-memory spool over to a real file ffmpeg can seek in
+    buffer = AudioBuffer.decode('file:/dev/stdin', duration=ANALYSIS_SECONDS, stdin=spool)
+    if buffer is None:
+        logger.warning("[Decode] Could not decode audio from the upload")
+        return None
+    logger.info(f"[Decode] {buffer.duration:.1f}s of PCM from the upload")
+    return buffer
+
+def decode_clip(file_path: str, start: float = 0) -> AudioBuffer | None:
+    """
+    Decode ANALYSIS_SECONDS of file_path from start to PCM. This is the only
+    decode of the clip: analysis and local matching read the buffer and the
+    AudD clip is encoded from it.
+    """
+    buffer = AudioBuffer.decode(file_path, start=start, duration=ANALYSIS_SECONDS)
+    if buffer is None:
+        logger.warning(f"[Decode] Could not decode audio from {file_path}")
+        return None
+    logger.info(f"[Decode] {buffer.duration:.1f}s of PCM from {file_path}")
+    return buffer
+
+# ─────────────────────────────────────────────
+# HELPER: Pipe the head of an upload through ffmpeg
 # ─────────────────────────────────────────────
-def truncate_audio_if_needed(file_path: str, max_mb: int = 8) -> str:
-    """If file is too large, truncate to first 30 seconds using ffmpeg."""
-    file_size = os.path.getsize(file_path)
-    max_bytes = max_mb * 1024 * 1024
-
-    if file_size <= max_bytes:
-        return file_path
-
-    logger.info(f"[Truncate] File too large ({file_size} bytes), truncating...")
-    truncated_path = file_path.replace('.mp3', '_short.mp3').replace('.mp4', '_short.mp3').replace('.m4a', '_short.mp3').replace('.wav', '_short.mp3')
-
-    # Try to use ffmpeg
-    ffmpeg_paths = [
-        '/var/www/pastefind-backend/bin/ffmpeg',
-        '/usr/bin/ffmpeg',
-        '/usr/local/bin/ffmpeg',
-        'ffmpeg'
-    ]
-
-    for ffmpeg in ffmpeg_paths:
+async def spawn_clip_decoder():
+    """Start ffmpeg reading media from stdin and writing the first ANALYSIS_SECONDS as PCM to stdout."""
+    return await ffmpeg.spawn(
+        ['-hide_banner', '-loglevel', 'error', '-i', 'pipe:0'] + pcm_decode_args(duration=ANALYSIS_SECONDS),
+        stdin=asyncio.subprocess.PIPE,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.DEVNULL,
+    )
+
+async def ingest_stream_head(stream, spool_path: str) -> dict:
+    """
+    Feed an incoming byte stream to ffmpeg and stop reading as soon as it has
+    decoded a full clip. Every byte read is also spooled to spool_path so the
+    regular path can take over when ffmpeg cannot decode from a pipe
+    (e.g. MP4 with the moov atom at the end).
+    """
+    started = time.perf_counter()
+    proc = await spawn_clip_decoder()
+    # Drain the PCM while writing, or ffmpeg blocks on a full stdout pipe
+    pcm_task = asyncio.create_task(proc.stdout.read()) if proc is not None else None
+    hasher = hashlib.sha256()
+    size = 0
+    complete = True
+
+    with open(spool_path, "wb") as spool:
+        async for chunk in stream:
+            if not chunk:
+                continue
+            size += len(chunk)
+            if size > UPLOAD_MAX_BYTES:
+                break
+            hasher.update(chunk)
+            spool.write(chunk)
+
+            if proc is None or proc.returncode is not None:
+                if proc is not None and proc.returncode == 0:
+                    complete = False
+                    break
+                continue
+            try:
+                proc.stdin.write(chunk)
+                await proc.stdin.drain()
+            except (BrokenPipeError, ConnectionResetError):
+                # ffmpeg stopped reading: either the clip is done or decoding failed
+                if await proc.wait() == 0:
+                    complete = False
+                    break
+
+    buffer = None
+    if proc is not None:
+        decoded = False
         try:
-            ret = os.system(f'{ffmpeg} -i "{file_path}" -t 30 -acodec libmp3lame -ab 128k "{truncated_path}" -y -loglevel quiet 2>/dev/null')
-            if ret == 0 and os.path.exists(truncated_path):
-                logger.info(f"[Truncate] Truncated to: {truncated_path}")
-                return truncated_path
-        except:
-            continue
+            if proc.returncode is None:
+                proc.stdin.close()
+            decoded = await asyncio.wait_for(proc.wait(), timeout=60) == 0
+        except asyncio.TimeoutError:
+            proc.kill()
+        except (BrokenPipeError, ConnectionResetError):
+            decoded = await proc.wait() == 0
+        pcm = await pcm_task
+        ffmpeg.record('ffmpeg', FFmpegResult(
+            proc.returncode if proc.returncode is not None else -1, time.perf_counter() - started
+        ))
+        # A container that could not be demuxed from a pipe can still exit 0 with under a second of audio
+        if decoded and len(pcm) >= 4 * PCM_SAMPLE_RATE:
+            buffer = AudioBuffer.from_pcm(pcm)
+
+    return {
+        "size": size,
+        "complete": complete,
+        "digest": hasher.hexdigest() if complete else None,
+        "buffer": buffer,
+    }
 
-    logger.warning("[Truncate] ffmpeg not available, using original file")
-    return file_path
+async def recognize_clip(buffer: AudioBuffer, clip_path: str, key: str = None) -> dict:
+    """
+    Recognize a decoded clip: local fingerprint index first. When the local match
+    is weak, the best window(s) of the buffer are encoded next to clip_path
+    (removed by the caller) for AudD. Clips of only silence or noise stop here as no_music.
+    """
+    parallel = RECOGNITION_MODE == 'parallel'
+    if parallel:
+        seconds = PARALLEL_WINDOW_SECONDS
+    elif RECOGNITION_MODE == 'progressive':
+        seconds = max(s + offset for s, offset in PROGRESSIVE_SCHEDULE)
+    else:
+        seconds = CLIP_SECONDS
+    segment = await run_stage("fingerprint", segment_selector.select, buffer, seconds,
+                              PARALLEL_WINDOWS if parallel else 1)
+    if MUSIC_DETECTION and segment["no_music"]:
+        return {"error": "no_music"}
+    starts = segment["starts"]
+
+    if local_recognizer.ready:
+        result = await run_stage("fingerprint", local_recognizer.recognize_buffer, buffer)
+        if result:
+            return result
+
+    if RECOGNITION_MODE == 'progressive':
+        result, window = await recognize_progressive(buffer, starts[0], clip_path, key)
+    elif len(starts) > 1:
+        result, window = await recognize_windows(buffer, starts, seconds, clip_path, key)
+    else:
+        result, window = await recognize_window(buffer, starts[0], seconds, clip_path, key)
+
+    # Learn only the window AudD heard: the rest of the buffer may be speech or another song
+    if LOCAL_LEARNING and result.get("title") and not result.get("error"):
+        schedule_learning(buffer.slice(*window), result)
+    return result
+
+async def recognize_progressive(buffer: AudioBuffer, start: float, clip_path: str, key: str = None) -> tuple[dict, tuple]:
+    """
+    Walk PROGRESSIVE_SCHEDULE from start: send a short clip first and only grow
+    or move the window while AudD answers no_match. Matches carry the 1-based
+    "step" that produced them. Returns (result, (start, seconds) of the last window sent).
+    """
+    progressive_stats["requests"] += 1
+    for step, (seconds, offset) in enumerate(PROGRESSIVE_SCHEDULE):
+        # Keep the window inside the buffer: move it back rather than send a short clip
+        window_start = max(0.0, min(start + offset, buffer.duration - seconds))
+        result, window = await recognize_window(buffer, window_start, seconds, clip_path,
+                                                f"{key}@{window_start:g}+{seconds:g}" if key else None)
+        if result.get("error") != "no_match":
+            if result.get("title"):
+                progressive_stats["hits_by_step"][step] += 1
+                logger.info(f"[Progressive] Match at step {step + 1} ({seconds:g}s at {window_start:g}s)")
+                return {**result, "step": step + 1}, window
+            return result, window
+        logger.info(f"[Progressive] No match at step {step + 1} ({seconds:g}s at {window_start:g}s)")
+    progressive_stats["misses"] += 1
+    return result, window
+
+async def encode_window(buffer: AudioBuffer, start: float, seconds: float, clip_path: str) -> str | None:
+    """Encode [start, start + seconds] of the buffer to clip_path for AudD."""
+    encoded = await run_stage("transcode", buffer.encode, clip_path, recognition_encode_args(),
+                              start=start, seconds=seconds)
+    if encoded:
+        logger.info(f"[Clip] Encoded {RECOGNITION_PROFILE['codec']} {start:g}-{start + seconds:g}s: {clip_path}")
+    return encoded
+
+async def recognize_window(buffer: AudioBuffer, start: float, seconds: float, clip_path: str,
+                           key: str = None) -> tuple[dict, tuple]:
+    """Encode one window of the buffer to clip_path and send it to AudD. Returns (result, (start, seconds))."""
+    if not await encode_window(buffer, start, seconds, clip_path):
+        return {"error": "Clip encoding failed"}, (start, seconds)
+    return await audd.recognize(clip_path, key=key), (start, seconds)
+
+async def recognize_windows(buffer: AudioBuffer, starts: list, seconds: float, clip_path: str,
+                            key: str = None) -> tuple[dict, tuple]:
+    """
+    Query AudD for several windows concurrently. The first match wins and the
+    other calls are cancelled (queued ones never reach AudD; one already being
+    sent finishes in its thread and is ignored). Without a match, a no_match
+    answer is returned if any window produced one. Returns (result, (start, seconds)).
+    """
+    root, ext = os.path.splitext(clip_path)
+    paths = [f"{root}_{i}{ext}" for i in range(len(starts))]
+    window_stats["parallel_requests"] += 1
+    try:
+        # Every window is encoded before any query starts, so no encode outlives the cleanup below
+        encoded = await asyncio.gather(*(encode_window(buffer, start, seconds, path)
+                                         for start, path in zip(starts, paths)))
+        tasks = {
+            asyncio.create_task(audd.recognize(path, key=f"{key}@{starts[i]:g}" if key else None)): i
+            for i, path in enumerate(encoded) if path
+        }
+        if not tasks:
+            return {"error": "Clip encoding failed"}, (starts[0], seconds)
+
+        results, errors = {}, []
+        pending = set(tasks)
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception():
+                        errors.append(task.exception())
+                        continue
+                    result = results[tasks[task]] = task.result()
+                    if result.get("title") and not result.get("error"):
+                        window_stats["hits_by_window"][tasks[task]] += 1
+                        logger.info(f"[Windows] Match in window {tasks[task]} ({starts[tasks[task]]:g}s), "
+                                    f"cancelling {len(pending)} other call(s)")
+                        return result, (starts[tasks[task]], seconds)
+        finally:
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+        if not results:
+            raise errors[0]
+        window_stats["misses"] += 1
+        index = next((i for i, r in results.items() if r.get("error") == "no_match"), min(results))
+        return results[index], (starts[index], seconds)
+    finally:
+        cleanup_files(*paths)
+
+def schedule_learning(buffer: AudioBuffer, result: dict):
+    """Fingerprint an AudD-identified clip into the learned index in the background."""
+    metadata = {k: result.get(k, '') for k in LEARNED_FIELDS}
+
+    async def learn():
+        try:
+            await run_stage("fingerprint", local_recognizer.learn_buffer, buffer, metadata)
+        except PoolBusyError:
+            logger.info("[Local] Fingerprint pool busy, skipping learning")
+        except Exception as e:
+            logger.error(f"[Local] Learning failed: {e}")
+
+    task = asyncio.create_task(learn())
+    learning_tasks.add(task)
+    task.add_done_callback(learning_tasks.discard)
+
+def clip_path_for(source_path: str) -> str:
+    """Where the AudD clip encoded from source_path's buffer goes."""
+    return f"{os.path.splitext(source_path)[0]}_clip.{RECOGNITION_PROFILE['ext']}"
+
+def cleanup_files(*paths: str):
+    for path in set(paths):
+        try:
+            os.remove(path)
+        except:
+            pass
 
 # ─────────────────────────────────────────────
 # ROUTES
@@ -288,9 +639,21 @@ async def health():
     return {
         "status": "healthy",
         "version": "3.0",
-        "audd_configured": bool(AUDD_API_TOKEN),
+        "audd_configured": audd.configured,
         "static_dir": STATIC_DIR,
-        "html_exists": os.path.exists(HTML_FILE)
+        "html_exists": os.path.exists(HTML_FILE),
+        "pools": pool_stats(),
+        "cache": result_cache.stats(),
+        "ffmpeg": ffmpeg.stats(),
+        "http": http.stats(),
+        "audd": audd.stats(),
+        "local": local_recognizer.stats(),
+        "music": music_detector.stats(),
+        "segments": segment_selector.stats(),
+        "windows": {"mode": RECOGNITION_MODE, **window_stats},
+        "progressive": {"schedule": PROGRESSIVE_SCHEDULE, **progressive_stats},
+        "metadata": metadata_stats,
+        "url_flights": url_flights.stats()
     }
 
 @app.get("/logo.png")
@@ -308,6 +671,109 @@ async def get_bg_wave():
     path = os.path.join(STATIC_DIR, 'bg-wave.png')
     return FileResponse(path) if os.path.exists(path) else JSONResponse({"error": "not found"}, 404)
 
+url_flights = SingleFlight()
+
+def metadata_result(match: dict, info: dict) -> dict:
+    """Shape a metadata identification like an AudD result."""
+    query = urllib.parse.quote(f"{match['title']} {match['artist']}")
+    return {
+        "title": match['title'],
+        "subtitle": match['artist'],
+        "image": info.get('thumbnail') or '',
+        "spotify_url": f"https://open.spotify.com/search/{query}",
+        "youtube_url": f"https://www.youtube.com/results?search_query={query}",
+        "apple_music": f"https://music.apple.com/search?term={query}",
+        "service": "metadata",
+    }
+
+async def analyze_url_audio(url: str, cache_key: str) -> dict | None:
+    """
+    Recognize url. With METADATA_FAST_PATH the page metadata is tried first;
+    otherwise (or on a miss) the audio is downloaded, clipped and recognized.
+    TikTok results are also cached per sound, so another video using the same
+    sound needs no download. Returns None when the download fails.
+    """
+    info = None
+    tiktok = TIKTOK_SOUND_CACHE and cache_key.startswith('tiktok:')
+    if METADATA_FAST_PATH or tiktok:
+        info = await run_stage("download", extract_media_info, url)
+        if info is None:
+            # Dead, private or geo-blocked: a download would only fail the same way
+            return None
+
+    if METADATA_FAST_PATH:
+        match = identify_music_from_youtube_metadata(info)
+        metadata_stats["checked"] += 1
+        if match and match['confidence'] == 'high':
+            metadata_stats["hits"] += 1
+            logger.info(f"[Metadata] {match['source']}: {match['artist']} - {match['title']}")
+            result = metadata_result(match, info)
+            result_cache.put(cache_key, result)
+            return result
+
+    sound = tiktok_sound(info) if tiktok else None
+    if sound:
+        result = result_cache.get(sound["key"])
+        if result is not None:
+            metadata_stats["sound_hits"] += 1
+            logger.info(f"[TikTok] Sound already recognized: {sound['key']}")
+        else:
+            # Videos sharing the sound share one download of the music-only asset
+            result = await url_flights.run(sound["key"], lambda: download_and_recognize(
+                url, sound["key"], info, sound["format_id"]))
+        if result is not None:
+            result_cache.put(cache_key, result)
+        return result
+
+    return await download_and_recognize(url, cache_key, info)
+
+async def download_and_recognize(url: str, cache_key: str, info: dict | None = None,
+                                 audio_format: str | None = None) -> dict | None:
+    """Download, clip and recognize url, caching the result under cache_key. None when the download fails."""
+    downloaded = await run_stage("download", download_audio, url, info=info, audio_format=audio_format)
+    if not downloaded:
+        return None
+
+    download_path, start = downloaded
+    clip_path = clip_path_for(download_path)
+    try:
+        buffer = await run_stage("transcode", decode_clip, download_path, start)
+        if buffer is None:
+            return {"error": "❌ Impossible de lire l'audio de cette vidéo."}
+
+        result = await recognize_clip(buffer, clip_path)
+        result_cache.put(cache_key, result)
+        return result
+    finally:
+        cleanup_files(download_path, clip_path)
+
+def download_failed(url: str) -> dict:
+    platform = "ce site"
+    if 'facebook.com' in url or 'fb.watch' in url:
+        platform = "Facebook"
+    elif 'instagram.com' in url:
+        platform = "Instagram"
+    elif 'tiktok.com' in url:
+        platform = "TikTok"
+    elif 'youtube.com' in url or 'youtu.be' in url:
+        platform = "YouTube"
+
+    return {
+        "error": f"❌ Impossible de télécharger l'audio depuis {platform}.\n\n💡 Essayez de télécharger la vidéo sur votre appareil, puis utilisez l'onglet 'Fichier Local'."
+    }
+
+def analyze_response(result: dict) -> JSONResponse:
+    if result.get("error") == "no_music":
+        return JSONResponse(status_code=200, content={
+            "error": "🔇 Aucune musique détectée dans cet extrait. Essayez avec une partie différente de la vidéo."
+        })
+    if result.get("error") == "no_match":
+        return JSONResponse(status_code=200, content={
+            "error": "🎵 Musique non reconnue. Essayez avec une partie différente de la vidéo."
+        })
+
+    return JSONResponse(status_code=200, content=result)
+
 @app.post("/api/analyze")
 async def analyze_video(data: VideoURL):
     """Analyze music from a video URL (Facebook, TikTok, Instagram, YouTube, etc.)"""
@@ -320,110 +786,326 @@ async def analyze_video(data: VideoURL):
                 "error": "❌ Lien invalide. Veuillez coller un lien complet (commençant par https://)"
             })
 
-        # Download audio
-        audio_path = download_audio(url)
+        cache_key = media_cache_key(url)
+        result = result_cache.get(cache_key)
+        if result is not None:
+            logger.info(f"[/api/analyze] Cache hit: {cache_key}")
+            return analyze_response(result)
 
-        if not audio_path:
-            platform = "ce site"
-            if 'facebook.com' in url or 'fb.watch' in url:
-                platform = "Facebook"
-            elif 'instagram.com' in url:
-                platform = "Instagram"
-            elif 'tiktok.com' in url:
-                platform = "TikTok"
-            elif 'youtube.com' in url or 'youtu.be' in url:
-                platform = "YouTube"
+        # Refuse early rather than queue behind a saturated pipeline
+        if not pools_have_capacity("download", "transcode", "recognize"):
+            return JSONResponse(status_code=503, content=BUSY_RESPONSE)
 
-            return JSONResponse(status_code=200, content={
-                "error": f"❌ Impossible de télécharger l'audio depuis {platform}.\n\n💡 Essayez de télécharger la vidéo sur votre appareil, puis utilisez l'onglet 'Fichier Local'."
-            })
+        # Concurrent requests for the same media share one download + recognition
+        result = await url_flights.run(cache_key, lambda: analyze_url_audio(url, cache_key))
 
-        # Truncate if too large
-        audio_path = truncate_audio_if_needed(audio_path)
+        if result is None:
+            return JSONResponse(status_code=200, content=download_failed(url))
 
-        # Analyze
-        result = analyze_with_audd(audio_path)
+        return analyze_response(result)
 
-        # Cleanup
-        try:
-            os.remove(audio_path)
-            if audio_path.endswith('_short.mp3'):
-                original = audio_path.replace('_short.mp3', '.mp3')
-                if os.path.exists(original):
-                    os.remove(original)
-        except:
-            pass
+    except PoolBusyError as e:
+        logger.warning(f"[/api/analyze] Busy: {e}")
+        return JSONResponse(status_code=503, content=BUSY_RESPONSE)
+    except Exception as e:
+        logger.error(f"[/api/analyze] Error: {e}")
+        return JSONResponse(status_code=500, content={"error": f"Erreur serveur: {str(e)}"})
 
-        if result.get("error") == "no_match":
-            return JSONResponse(status_code=200, content={
-                "error": "🎵 Musique non reconnue. Essayez avec une partie différente de la vidéo."
-            })
 
-        if "error" in result:
-            return JSONResponse(status_code=200, content=result)
+# ─────────────────────────────────────────────
+# TIMELINE: Tracklist of long media
+# ─────────────────────────────────────────────
+def timeline_window_key(key: str, start: float) -> str:
+    return f"{key}#{start:g}+{TIMELINE_WINDOW_SECONDS}"
+
+async def recognize_timeline_window(download_path: str, start: float, key: str) -> dict:
+    """Recognize one timeline window; windows already in the result cache are not processed again."""
+    window_key = timeline_window_key(key, start)
+    result = result_cache.get(window_key)
+    if result is not None:
+        return {"start": start, "result": result, "cached": True}
+
+    try:
+        buffer = await run_stage("transcode", AudioBuffer.decode, download_path, start, TIMELINE_WINDOW_SECONDS)
+        if buffer is None:
+            return {"start": start, "result": {"error": "Decode failed"}, "cached": False}
+        clip_path = f"{os.path.splitext(download_path)[0]}_t{start:g}.{RECOGNITION_PROFILE['ext']}"
+        try:
+            result = await recognize_clip(buffer, clip_path, window_key)
+        finally:
+            cleanup_files(clip_path)
+    except PoolBusyError as e:
+        # Left out of the cache: the next run retries this window
+        logger.warning(f"[Timeline] Window {start:g}s skipped: {e}")
+        result = {"error": "busy"}
+
+    result_cache.put(window_key, result)
+    return {"start": start, "result": result, "cached": False}
+
+async def timeline_events(url: str, key: str):
+    """
+    Recognize url in overlapping windows over its first TIMELINE_MAX_SECONDS,
+    at most TIMELINE_CONCURRENCY at a time. Yields {"window": ...} as each
+    window completes, then the merged {"tracklist": ...} (or a single {"error": ...}).
+    The media is only downloaded when some window is not in the result cache.
+    """
+    info = await run_stage("download", extract_media_info, url)
+    if info is None:
+        yield download_failed(url)
+        return
+
+    duration = min(info.get("duration") or 0, TIMELINE_MAX_SECONDS)
+    starts = window_starts(duration, TIMELINE_WINDOW_SECONDS, TIMELINE_HOP_SECONDS) if duration else []
+    cached = {}
+    for start in starts:
+        result = result_cache.get(timeline_window_key(key, start))
+        if result is not None:
+            cached[start] = result
+
+    download_path = None
+    if not starts or len(cached) < len(starts):
+        downloaded = await run_stage("download", download_audio, url, 0, TIMELINE_MAX_SECONDS, info=info)
+        if not downloaded:
+            yield download_failed(url)
+            return
+        download_path, _ = downloaded
 
-        return JSONResponse(status_code=200, content=result)
+    try:
+        if not duration:
+            # No duration in the page metadata: measure the download
+            probed = await run_stage("transcode", probe_audio, download_path) or {}
+            duration = min(probed.get("duration") or 0, TIMELINE_MAX_SECONDS)
+            if not duration:
+                yield {"error": "❌ Impossible de lire l'audio de cette vidéo."}
+                return
+            starts = window_starts(duration, TIMELINE_WINDOW_SECONDS, TIMELINE_HOP_SECONDS)
+
+        logger.info(f"[Timeline] {len(starts)} windows over {duration:.0f}s ({len(cached)} cached): {url}")
+        limit = asyncio.Semaphore(TIMELINE_CONCURRENCY)
+
+        async def bounded(start: float) -> dict:
+            if start in cached:
+                return {"start": start, "result": cached[start], "cached": True}
+            async with limit:
+                return await recognize_timeline_window(download_path, start, key)
+
+        tasks = [asyncio.create_task(bounded(start)) for start in starts]
+        windows = []
+        try:
+            for next_window in asyncio.as_completed(tasks):
+                window = await next_window
+                windows.append(window)
+                yield {"window": {
+                    "start": window["start"],
+                    "timestamp": format_timestamp(window["start"]),
+                    "cached": window["cached"],
+                    **window["result"],
+                }}
+        finally:
+            # Client gone or a window failed: stop the windows still waiting
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        tracklist = merge_windows(windows, TIMELINE_WINDOW_SECONDS, duration)
+        from_cache = sum(window["cached"] for window in windows)
+        logger.info(f"[Timeline] {len(tracklist)} tracks, {from_cache}/{len(windows)} windows from cache: {url}")
+        yield {"duration": duration, "windows": len(windows), "cached_windows": from_cache, "tracklist": tracklist}
+    finally:
+        if download_path:
+            cleanup_files(download_path)
+
+@app.post("/api/timeline")
+async def analyze_timeline(data: VideoURL, stream: bool = False):
+    """
+    Tracklist with timestamps for a long video or mix. With ?stream=true the
+    answer is NDJSON: one line per recognized window, then the tracklist.
+    """
+    url = clean_url(data.url.strip())
+    logger.info(f"[/api/timeline] URL: {url}")
+
+    if not url or not url.startswith(('http://', 'https://')):
+        return JSONResponse(status_code=200, content={
+            "error": "❌ Lien invalide. Veuillez coller un lien complet (commençant par https://)"
+        })
+
+    if not pools_have_capacity("download", "transcode", "recognize"):
+        return JSONResponse(status_code=503, content=BUSY_RESPONSE)
+
+    events = timeline_events(url, media_cache_key(url))
+
+    if stream:
+        async def ndjson():
+            try:
+                async for event in events:
+                    yield json.dumps(event, ensure_ascii=False) + "\n"
+            except PoolBusyError as e:
+                logger.warning(f"[/api/timeline] Busy: {e}")
+                yield json.dumps(BUSY_RESPONSE, ensure_ascii=False) + "\n"
+            except Exception as e:
+                logger.error(f"[/api/timeline] Error: {e}")
+                yield json.dumps({"error": f"Erreur serveur: {str(e)}"}, ensure_ascii=False) + "\n"
+
+        return StreamingResponse(ndjson(), media_type="application/x-ndjson")
 
+    try:
+        final = {}
+        async for event in events:
+            if "window" not in event:
+                final = event
+        return JSONResponse(status_code=200, content=final)
+
+    except PoolBusyError as e:
+        logger.warning(f"[/api/timeline] Busy: {e}")
+        return JSONResponse(status_code=503, content=BUSY_RESPONSE)
     except Exception as e:
-        logger.error(f"[/api/analyze] Error: {e}")
+        logger.error(f"[/api/timeline] Error: {e}")
         return JSONResponse(status_code=500, content={"error": f"Erreur serveur: {str(e)}"})
 
 
+ALLOWED_EXTENSIONS = {"mp3", "wav", "mp4", "m4a", "webm", "ogg", "aac", "flac"}
+
+def unsupported_format_response(file_ext: str) -> JSONResponse:
+    return JSONResponse(status_code=400, content={
+        "error": f"❌ Format non supporté : .{file_ext}\n\nFormats acceptés : MP3, MP4, WAV, M4A, WEBM, OGG, AAC, FLAC"
+    })
+
+def upload_response(result: dict) -> JSONResponse:
+    if result.get("error") == "no_music":
+        return JSONResponse(status_code=200, content={
+            "error": "🔇 Aucune musique détectée dans ce fichier. Essayez un extrait différent."
+        })
+    if result.get("error") == "no_match":
+        return JSONResponse(status_code=200, content={
+            "error": "🎵 Musique non reconnue dans ce fichier. Essayez un extrait différent."
+        })
+
+    return JSONResponse(status_code=200, content=result)
+
 @app.post("/api/upload")
 async def upload_file(file: UploadFile = File(...)):
     """Analyze music from an uploaded audio/video file."""
     try:
+        # Oversized bodies never get here: UploadSizeLimit refuses them while they arrive
         filename = file.filename or "upload"
         logger.info(f"[/api/upload] File: {filename}")
 
         # Check extension
-        allowed_extensions = {"mp3", "wav", "mp4", "m4a", "webm", "ogg", "aac", "flac"}
         file_ext = filename.rsplit('.', 1)[-1].lower() if '.' in filename else 'mp3'
 
-        if file_ext not in allowed_extensions:
-            return JSONResponse(status_code=400, content={
-                "error": f"❌ Format non supporté : .{file_ext}\n\nFormats acceptés : MP3, MP4, WAV, M4A, WEBM, OGG, AAC, FLAC"
-            })
+        if file_ext not in ALLOWED_EXTENSIONS:
+            return unsupported_format_response(file_ext)
 
-        # Save to temp
-        temp_path = f"/tmp/{uuid.uuid4()}.{file_ext}"
-        content = await file.read()
+        # Hash the framework's spooled copy in chunks: the upload is not written to disk again
+        hasher = hashlib.sha256()
+        size = 0
+        while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+            size += len(chunk)
+            hasher.update(chunk)
 
-        if len(content) == 0:
+        if size == 0:
             return JSONResponse(status_code=400, content={"error": "❌ Le fichier est vide."})
 
-        with open(temp_path, "wb") as f_out:
-            f_out.write(content)
+        logger.info(f"[/api/upload] Received {size} bytes")
 
-        logger.info(f"[/api/upload] Saved: {temp_path} ({len(content)} bytes)")
+        # Byte-identical re-uploads are answered from the cache
+        cache_key = f"sha256:{hasher.hexdigest()}"
+        result = result_cache.get(cache_key)
+        if result is not None:
+            logger.info(f"[/api/upload] Cache hit: {cache_key}")
+            return upload_response(result)
 
-        # Truncate if too large
-        temp_path = truncate_audio_if_needed(temp_path)
+        if not pools_have_capacity("transcode", "recognize"):
+            return JSONResponse(status_code=503, content=BUSY_RESPONSE)
 
-        # Analyze
-        result = analyze_with_audd(temp_path)
-
-        # Cleanup
+        clip_path = clip_path_for(f"/tmp/{uuid.uuid4()}.{file_ext}")
         try:
-            os.remove(temp_path)
-        except:
-            pass
-
-        if result.get("error") == "no_match":
-            return JSONResponse(status_code=200, content={
-                "error": "🎵 Musique non reconnue dans ce fichier. Essayez un extrait différent."
-            })
+            buffer = await run_stage("transcode", decode_spool, file.file)
+            if buffer is None:
+                return JSONResponse(status_code=200, content={"error": "❌ Impossible de lire ce fichier."})
 
-        if "error" in result:
-            return JSONResponse(status_code=200, content=result)
+            result = await recognize_clip(buffer, clip_path, key=cache_key)
+            result_cache.put(cache_key, result)
+        finally:
+            cleanup_files(clip_path)
 
-        return JSONResponse(status_code=200, content=result)
+        return upload_response(result)
 
+    except PoolBusyError as e:
+        logger.warning(f"[/api/upload] Busy: {e}")
+        return JSONResponse(status_code=503, content=BUSY_RESPONSE)
     except Exception as e:
         logger.error(f"[/api/upload] Error: {e}")
         return JSONResponse(status_code=500, content={"error": f"Erreur serveur: {str(e)}"})
 
 
+@app.post("/api/upload-stream")
+async def upload_stream(request: Request, filename: str = "upload.mp3"):
+    """
+    Analyze music from a file sent as the raw request body.
+    Only the first ANALYSIS_SECONDS are ingested: the body is piped into ffmpeg and
+    reading stops once the clip is decoded, the rest of the upload is never read.
+    """
+    temp_path = clip_path = None
+    try:
+        logger.info(f"[/api/upload-stream] File: {filename}")
+
+        file_ext = filename.rsplit('.', 1)[-1].lower() if '.' in filename else 'mp3'
+        if file_ext not in ALLOWED_EXTENSIONS:
+            return unsupported_format_response(file_ext)
+
+        content_length = request.headers.get('content-length', '')
+        if content_length.isdigit() and int(content_length) > UPLOAD_MAX_BYTES:
+            return JSONResponse(status_code=413, content=TOO_LARGE_RESPONSE)
+
+        if not pools_have_capacity("transcode", "recognize"):
+            return JSONResponse(status_code=503, content=BUSY_RESPONSE)
+
+        temp_path = f"/tmp/{uuid.uuid4()}.{file_ext}"
+        clip_path = clip_path_for(temp_path)
+
+        ingest = await ingest_stream_head(request.stream(), temp_path)
+
+        if ingest["size"] > UPLOAD_MAX_BYTES:
+            return JSONResponse(status_code=413, content=TOO_LARGE_RESPONSE)
+        if ingest["size"] == 0:
+            return JSONResponse(status_code=400, content={"error": "❌ Le fichier est vide."})
+
+        logger.info(
+            f"[/api/upload-stream] Read {ingest['size']} bytes "
+            f"({'full body' if ingest['complete'] else 'head only'}), decoded from stream: {ingest['buffer'] is not None}"
+        )
+
+        # A fully read body can be deduplicated like a regular upload
+        cache_key = f"sha256:{ingest['digest']}" if ingest["digest"] else None
+        if cache_key:
+            result = result_cache.get(cache_key)
+            if result is not None:
+                logger.info(f"[/api/upload-stream] Cache hit: {cache_key}")
+                return upload_response(result)
+
+        buffer = ingest["buffer"]
+        if buffer is None and ingest["complete"]:
+            buffer = await run_stage("transcode", decode_clip, temp_path)
+        if buffer is None:
+            return JSONResponse(status_code=200, content={"error": "❌ Impossible de lire ce fichier."})
+
+        result = await recognize_clip(buffer, clip_path, key=cache_key)
+        if cache_key:
+            result_cache.put(cache_key, result)
+
+        return upload_response(result)
+
+    except PoolBusyError as e:
+        logger.warning(f"[/api/upload-stream] Busy: {e}")
+        return JSONResponse(status_code=503, content=BUSY_RESPONSE)
+    except Exception as e:
+        logger.error(f"[/api/upload-stream] Error: {e}")
+        return JSONResponse(status_code=500, content={"error": f"Erreur serveur: {str(e)}"})
+    finally:
+        cleanup_files(*[p for p in (temp_path, clip_path) if p])
+
+
 @app.get("/privacy", response_class=HTMLResponse)
 async def privacy_policy():
     """Privacy policy page."""
@@ -0,0 +1,161 @@
+"""
+Music presence detection for PasteFind
+Cheap frame features on the decoded clip (energy, spectral flatness, onset
+rhythm) find where the music starts and tell clear silence or noise apart
+before a clip is sent to AudD.
+"""
+import logging
+import threading
+
+import numpy as np
+
+from audio_buffer import AudioBuffer
+
+logger = logging.getLogger(__name__)
+
+ANALYSIS_SAMPLE_RATE = 8000
+FRAME_SIZE = 512
+HOP_SIZE = 256
+FRAMES_PER_SECOND = ANALYSIS_SAMPLE_RATE / HOP_SIZE
+
+SILENCE_DB = -50        # frames quieter than this (dBFS) count as silent
+NOISE_FLATNESS = 0.5    # median flatness at which a window counts as pure noise
+CLEAR_SILENCE = 0.95    # share of silent frames at which a window counts as silence
+LOW_ENERGY_RATIO = 0.5  # speech spends about half its frames in pauses and consonants
+BEAT_LAGS = (0.25, 1.5)  # seconds: 40-240 BPM
+CHROMA_RANGE = (100, 3500)  # Hz folded into the 12 pitch classes
+
+
+def _chroma_matrix() -> np.ndarray:
+    """(FFT bins x 12) map from power spectrum bins to pitch classes."""
+    freqs = np.fft.rfftfreq(FRAME_SIZE, 1 / ANALYSIS_SAMPLE_RATE)
+    matrix = np.zeros((len(freqs), 12), dtype=np.float32)
+    usable = (freqs >= CHROMA_RANGE[0]) & (freqs <= CHROMA_RANGE[1])
+    pitch_class = np.round(12 * np.log2(freqs[usable] / 440)).astype(int) % 12
+    matrix[np.nonzero(usable)[0], pitch_class] = 1
+    return matrix
+
+
+CHROMA_MATRIX = _chroma_matrix()
+
+
+def frame_features(samples: np.ndarray) -> dict:
+    """Per-frame RMS, spectral flatness, positive spectral flux and chroma of samples at ANALYSIS_SAMPLE_RATE."""
+    if len(samples) < FRAME_SIZE:
+        empty = np.empty(0, dtype=np.float32)
+        return {"rms": empty, "flatness": empty, "flux": empty, "chroma": np.empty((0, 12), dtype=np.float32)}
+    frames = np.lib.stride_tricks.sliding_window_view(samples, FRAME_SIZE)[::HOP_SIZE]
+    rms = np.sqrt(np.mean(frames ** 2, axis=1)) + 1e-10
+    power = np.abs(np.fft.rfft(frames * np.hanning(FRAME_SIZE).astype(np.float32), axis=1)) ** 2 + 1e-12
+    log_power = np.log(power)
+    flatness = np.exp(log_power.mean(axis=1)) / power.mean(axis=1)
+    flux = np.concatenate([[0.0], np.maximum(np.diff(log_power, axis=0), 0).mean(axis=1)])
+    chroma = (power @ CHROMA_MATRIX).astype(np.float32)
+    return {"rms": rms, "flatness": flatness, "flux": flux, "chroma": chroma}
+
+
+def beat_strength(flux: np.ndarray) -> float:
+    """Peak autocorrelation of the onset envelope over plausible beat periods (0..1)."""
+    lo, hi = int(BEAT_LAGS[0] * FRAMES_PER_SECOND), int(BEAT_LAGS[1] * FRAMES_PER_SECOND)
+    if len(flux) <= hi:
+        return 0.0
+    centered = flux - flux.mean()
+    spectrum = np.fft.rfft(centered, 2 * len(centered))
+    autocorr = np.fft.irfft(spectrum * np.conj(spectrum))[:len(centered)]
+    if autocorr[0] <= 0:
+        return 0.0
+    return float(np.clip(autocorr[lo:hi].max() / autocorr[0], 0, 1))
+
+
+def window_score(features: dict, first: int, last: int) -> dict:
+    """
+    Music likelihood of frames [first, last): sustained (few silent or low-energy
+    frames), tonal (low flatness) and rhythmic (strong beat periodicity).
+    """
+    rms = features["rms"][first:last]
+    loud = rms > 10 ** (SILENCE_DB / 20)
+    silent = 1 - float(loud.mean()) if len(rms) else 1.0
+    if not loud.any():
+        return {"score": 0.0, "silent": 1.0, "low_energy": 1.0, "flatness": 1.0, "beat": 0.0}
+
+    low_energy = float((rms < 0.5 * rms[loud].mean()).mean())
+    flatness = float(np.median(features["flatness"][first:last][loud]))
+    beat = beat_strength(features["flux"][first:last])
+
+    sustain = 1 - min(1.0, low_energy / LOW_ENERGY_RATIO)
+    tonal = 1 - min(1.0, flatness / NOISE_FLATNESS)
+    score = (1 - silent) * tonal * (0.5 * sustain + 0.5 * beat)
+    return {
+        "score": round(score, 3),
+        "silent": round(silent, 3),
+        "low_energy": round(low_energy, 3),
+        "flatness": round(flatness, 4),
+        "beat": round(beat, 3),
+    }
+
+
+def is_silence_or_noise(window: dict) -> bool:
+    return window["silent"] >= CLEAR_SILENCE or window["flatness"] >= NOISE_FLATNESS
+
+
+def score_windows(buffer: AudioBuffer, window_seconds: float, hop_seconds: float, features: dict = None) -> list:
+    """Score every window of the buffer. Returns [{"start": seconds, "score": ..., ...}]."""
+    features = features or frame_features(buffer.at_rate(ANALYSIS_SAMPLE_RATE))
+    total = len(features["rms"])
+    size = max(1, int(window_seconds * FRAMES_PER_SECOND))
+    hop = max(1, int(hop_seconds * FRAMES_PER_SECOND))
+    starts = range(0, max(1, total - size + 1), hop)
+    return [{"start": round(first / FRAMES_PER_SECOND, 2), **window_score(features, first, first + size)}
+            for first in starts]
+
+
+class MusicDetector:
+    """
+    Decides whether a decoded clip contains music and where it starts.
+    Windows are scored from the beginning; the first one above min_score marks
+    the start of the music. Only a clip whose every window is silence or noise
+    is reported as no music; one with no window above min_score is uncertain
+    (quiet or sparse music scores low too) and still goes to AudD.
+    """
+
+    def __init__(self, min_score: float = 0.3, window_seconds: float = 5, hop_seconds: float = 2.5):
+        self.min_score = min_score
+        self.window_seconds = window_seconds
+        self.hop_seconds = hop_seconds
+        self._lock = threading.Lock()
+        self._counters = {"checked": 0, "no_music": 0, "uncertain": 0, "skipped_intro": 0}
+
+    def analyze(self, buffer: AudioBuffer, features: dict = None) -> dict:
+        """
+        {"music": bool, "no_music": bool, "start": seconds into the buffer,
+        "score": window score, "windows": every window's scores}. music: a window
+        reached min_score; no_music: every window is silence or noise.
+        features: precomputed frame_features.
+        """
+        windows = score_windows(buffer, self.window_seconds, self.hop_seconds, features)
+        music = next((w for w in windows if w["score"] >= self.min_score), None)
+        best = max(windows, key=lambda w: w["score"]) if windows else {"score": 0.0}
+        no_music = music is None and all(is_silence_or_noise(w) for w in windows)
+
+        with self._lock:
+            self._counters["checked"] += 1
+            if no_music:
+                self._counters["no_music"] += 1
+            elif music is None:
+                self._counters["uncertain"] += 1
+            elif music["start"] > 0:
+                self._counters["skipped_intro"] += 1
+
+        if no_music:
+            logger.info(f"[Music] Only silence or noise (best window: {best})")
+            return {"music": False, "no_music": True, "start": 0.0, "score": best["score"], "windows": windows}
+        if music is None:
+            logger.info(f"[Music] No window above {self.min_score}, sending anyway (best window: {best})")
+            return {"music": False, "no_music": False, "start": 0.0, "score": best["score"], "windows": windows}
+        if music["start"] > 0:
+            logger.info(f"[Music] Music starts at {music['start']}s: {music}")
+        return {"music": True, "no_music": False, "start": music["start"], "score": music["score"], "windows": windows}
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self._counters, "min_score": self.min_score}
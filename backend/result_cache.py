@@ -0,0 +1,120 @@
+"""
+Recognition result cache for PasteFind
+In-memory LRU tier with an optional SQLite tier, both with TTLs.
+"""
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+def is_negative(result: dict) -> bool:
+    return result.get("error") in ("no_match", "no_music")
+
+
+def is_cacheable(result: dict) -> bool:
+    """Matches and clean no_match / no_music answers are cacheable; transient errors are not."""
+    return "error" not in result or is_negative(result)
+
+
+class ResultCache:
+    """
+    Two-tier cache of recognition results keyed by a canonical string key.
+    Matches live for ttl seconds, no_match results for negative_ttl seconds.
+    """
+
+    def __init__(self, max_entries: int = 1000, ttl: float = 7 * 86400,
+                 negative_ttl: float = 3600, db_path: str = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._memory = OrderedDict()  # key -> (expires_at, result)
+        self._lock = threading.Lock()
+        self._db = None
+        self._counters = {"memory_hits": 0, "disk_hits": 0, "negative_hits": 0, "misses": 0, "stores": 0}
+
+        if db_path:
+            try:
+                self._db = sqlite3.connect(db_path, check_same_thread=False)
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS results ("
+                    "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+                )
+                self._db.execute("DELETE FROM results WHERE expires_at < ?", (time.time(),))
+                self._db.commit()
+                logger.info(f"[Cache] SQLite tier: {db_path}")
+            except sqlite3.Error as e:
+                logger.warning(f"[Cache] SQLite tier disabled: {e}")
+                self._db = None
+
+    def _remember(self, key: str, expires_at: float, result: dict):
+        self._memory[key] = (expires_at, result)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _hit(self, tier: str, result: dict) -> dict:
+        self._counters[tier] += 1
+        if is_negative(result):
+            self._counters["negative_hits"] += 1
+        return dict(result)
+
+    def get(self, key: str) -> dict | None:
+        """Return a copy of the cached result for key, or None."""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry:
+                expires_at, result = entry
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                    return self._hit("memory_hits", result)
+                del self._memory[key]
+
+            if self._db is not None:
+                try:
+                    row = self._db.execute(
+                        "SELECT value, expires_at FROM results WHERE key = ?", (key,)
+                    ).fetchone()
+                    if row and row[1] > now:
+                        result = json.loads(row[0])
+                        self._remember(key, row[1], result)
+                        return self._hit("disk_hits", result)
+                except sqlite3.Error as e:
+                    logger.warning(f"[Cache] SQLite read failed: {e}")
+
+            self._counters["misses"] += 1
+            return None
+
+    def put(self, key: str, result: dict):
+        """Store result under key if it is a match or a clean no_match."""
+        if not is_cacheable(result):
+            return
+        expires_at = time.time() + (self.negative_ttl if is_negative(result) else self.ttl)
+        with self._lock:
+            self._remember(key, expires_at, dict(result))
+            self._counters["stores"] += 1
+            if self._db is not None:
+                try:
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO results (key, value, expires_at) VALUES (?, ?, ?)",
+                        (key, json.dumps(result), expires_at),
+                    )
+                    self._db.commit()
+                except sqlite3.Error as e:
+                    logger.warning(f"[Cache] SQLite write failed: {e}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._counters["memory_hits"] + self._counters["disk_hits"] + self._counters["misses"]
+            hits = lookups - self._counters["misses"]
+            return {
+                **self._counters,
+                "entries": len(self._memory),
+                "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+                "disk_tier": self._db is not None,
+            }
@@ -0,0 +1,133 @@
+"""
+Recognition window selection for PasteFind
+Scores every candidate clip window of the decoded audio and keeps the one most
+likely to be recognized, instead of always sending the first seconds.
+"""
+import logging
+import threading
+
+import numpy as np
+
+from audio_buffer import AudioBuffer
+from music_presence import ANALYSIS_SAMPLE_RATE, FRAMES_PER_SECOND, MusicDetector, frame_features
+
+logger = logging.getLogger(__name__)
+
+BLOCK_SECONDS = 0.5          # chroma is compared between blocks of this length
+MIN_REPEAT_DISTANCE = 5      # seconds: closer blocks are the same passage, not a repeat
+
+# Weights of the window score components (each in 0..1)
+PRESENCE_WEIGHT = 0.5
+LOUDNESS_WEIGHT = 0.25
+REPETITION_WEIGHT = 0.25
+
+
+def repetition_scores(chroma: np.ndarray) -> np.ndarray:
+    """
+    Per-frame repetition: best chroma similarity of the frame's block with any
+    block at least MIN_REPEAT_DISTANCE away. Choruses repeat, verses less so.
+    """
+    per_block = max(1, int(BLOCK_SECONDS * FRAMES_PER_SECOND))
+    n_blocks = len(chroma) // per_block
+    if n_blocks < 2:
+        return np.zeros(len(chroma), dtype=np.float32)
+
+    blocks = chroma[:n_blocks * per_block].reshape(n_blocks, per_block, 12).mean(axis=1)
+    norms = np.linalg.norm(blocks, axis=1, keepdims=True)
+    blocks = np.divide(blocks, norms, out=np.zeros_like(blocks), where=norms > 0)
+
+    similarity = blocks @ blocks.T
+    distance = np.abs(np.arange(n_blocks)[:, None] - np.arange(n_blocks)[None, :])
+    similarity[distance < MIN_REPEAT_DISTANCE / BLOCK_SECONDS] = 0
+    best = similarity.max(axis=1).clip(0, 1)
+
+    per_frame = np.repeat(best, per_block)
+    return np.pad(per_frame, (0, len(chroma) - len(per_frame)), mode='edge').astype(np.float32)
+
+
+def _window_means(values: np.ndarray, starts: np.ndarray, size: int) -> np.ndarray:
+    """Mean of values[start:start + size] for every start, through a cumulative sum."""
+    cumulative = np.concatenate([[0.0], np.cumsum(values, dtype=np.float64)])
+    ends = np.minimum(starts + size, len(values))
+    return (cumulative[ends] - cumulative[starts]) / np.maximum(ends - starts, 1)
+
+
+def _normalized(values: np.ndarray) -> np.ndarray:
+    spread = values.max() - values.min() if len(values) else 0
+    return (values - values.min()) / spread if spread > 1e-9 else np.zeros_like(values)
+
+
+class SegmentSelector:
+    """
+    Picks the clip_seconds window of a decoded buffer to send for recognition.
+    Candidates start every hop_seconds; each is scored on music presence
+    (MusicDetector window scores), relative loudness and repetition (chorus
+    likelihood). Buffers too short to choose from, or with only silence or
+    noise, keep the detector's start.
+    With count > 1, the best non-overlapping windows are returned, best first.
+    """
+
+    def __init__(self, detector: MusicDetector, hop_seconds: float = 2.5):
+        self.detector = detector
+        self.hop_seconds = hop_seconds
+        self._lock = threading.Lock()
+        self._counters = {"selections": 0, "moved": 0}
+
+    def select(self, buffer: AudioBuffer, clip_seconds: float, count: int = 1) -> dict:
+        """{"music", "no_music": detector verdicts, "start": best window start in seconds, "starts": up to count starts, "score": ...}."""
+        features = frame_features(buffer.at_rate(ANALYSIS_SAMPLE_RATE))
+        presence = self.detector.analyze(buffer, features)
+        if presence["no_music"] or buffer.duration < clip_seconds + self.hop_seconds:
+            return {**presence, "starts": [presence["start"]]}
+
+        fps = FRAMES_PER_SECOND
+        size = int(clip_seconds * fps)
+        starts = np.arange(0, buffer.duration - clip_seconds + 1e-6, self.hop_seconds)
+        first_frames = (starts * fps).astype(np.int64)
+
+        # Music presence: mean detector score of the short windows inside each candidate
+        windows = presence["windows"]
+        window_starts = np.array([w["start"] for w in windows])
+        window_scores = np.array([w["score"] for w in windows])
+        inside = (window_starts[None, :] >= starts[:, None] - 1e-6) & \
+                 (window_starts[None, :] + self.detector.window_seconds <= starts[:, None] + clip_seconds + 1e-6)
+        music = np.where(inside.any(axis=1),
+                         (inside * window_scores).sum(axis=1) / np.maximum(inside.sum(axis=1), 1), 0)
+
+        loudness = _window_means(20 * np.log10(features["rms"]), first_frames, size)
+        repetition = _window_means(repetition_scores(features["chroma"]), first_frames, size)
+
+        scores = (
+            PRESENCE_WEIGHT * (music / music.max() if music.max() > 0 else music)
+            + LOUDNESS_WEIGHT * _normalized(loudness)
+            + REPETITION_WEIGHT * repetition
+        )
+        best = int(np.argmax(scores))
+        start = round(float(starts[best]), 2)
+
+        chosen = []
+        for i in np.argsort(-scores, kind='stable'):
+            if all(abs(starts[i] - starts[j]) >= clip_seconds for j in chosen):
+                chosen.append(int(i))
+                if len(chosen) == count:
+                    break
+
+        with self._lock:
+            self._counters["selections"] += 1
+            if start != presence["start"]:
+                self._counters["moved"] += 1
+        logger.info(
+            f"[Segment] {clip_seconds:g}s window at {start}s of {buffer.duration:.1f}s "
+            f"(music {music[best]:.2f}, loudness {loudness[best]:.1f} dB, repetition {repetition[best]:.2f})"
+        )
+        return {
+            "music": presence["music"],
+            "no_music": False,
+            "start": start,
+            "starts": [round(float(starts[i]), 2) for i in chosen],
+            "score": round(float(scores[best]), 3),
+        }
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._counters)
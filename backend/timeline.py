@@ -0,0 +1,68 @@
+"""
+Timeline analysis for PasteFind
+Long media (DJ sets, compilations, mixes) is cut into overlapping windows that
+are recognized separately; consecutive windows with the same track are merged
+into a tracklist with timestamps.
+"""
+
+
+def window_starts(duration: float, window_seconds: float, hop_seconds: float) -> list:
+    """Start of every window covering [0, duration]; the last one is aligned to the end."""
+    if duration <= window_seconds:
+        return [0.0]
+    starts = []
+    start = 0.0
+    while start + window_seconds < duration:
+        starts.append(round(start, 2))
+        start += hop_seconds
+    starts.append(round(duration - window_seconds, 2))
+    return starts
+
+
+def format_timestamp(seconds: float) -> str:
+    """125 -> "02:05", 3725 -> "1:02:05"."""
+    seconds = int(seconds)
+    hours, rest = divmod(seconds, 3600)
+    minutes, secs = divmod(rest, 60)
+    return f"{hours}:{minutes:02d}:{secs:02d}" if hours else f"{minutes:02d}:{secs:02d}"
+
+
+def track_identity(result: dict) -> tuple | None:
+    """What makes two window results the same track, or None for a miss."""
+    if not result or result.get("error") or not result.get("title"):
+        return None
+    return result["title"].strip().lower(), (result.get("subtitle") or "").strip().lower()
+
+
+def merge_windows(windows: list, window_seconds: float, duration: float) -> list:
+    """
+    Merge [{"start": seconds, "result": dict}] into tracklist entries
+    {"start", "end", "timestamp", "windows", **result}. Adjacent windows with
+    the same track form one entry; misses split entries. Where two entries
+    overlap (windows overlap), the earlier one ends where the next begins.
+    """
+    tracklist = []
+    previous = None
+    for window in sorted(windows, key=lambda w: w["start"]):
+        identity = track_identity(window["result"])
+        end = min(duration, window["start"] + window_seconds)
+        if identity is None:
+            previous = None
+            continue
+        if identity == previous:
+            tracklist[-1]["end"] = end
+            tracklist[-1]["windows"] += 1
+            continue
+        if tracklist and tracklist[-1]["end"] > window["start"]:
+            tracklist[-1]["end"] = window["start"]
+        tracklist.append({
+            **{k: v for k, v in window["result"].items() if k not in ("step", "confidence")},
+            "start": window["start"],
+            "end": end,
+            "windows": 1,
+        })
+        previous = identity
+
+    for entry in tracklist:
+        entry["timestamp"] = format_timestamp(entry["start"])
+    return tracklist
@@ -0,0 +1,75 @@
+"""
+Request body size limit for PasteFind uploads
+Multipart bodies are read and spooled to disk by the framework before the
+route runs, so the size cutoff has to sit in front of it, on the raw body.
+"""
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class BodyTooLarge(Exception):
+    pass
+
+
+class UploadSizeLimit:
+    """
+    ASGI middleware refusing request bodies over max_bytes on the given paths
+    with 413. Content-Length is checked before anything is read; chunked bodies
+    are counted as they arrive and reading stops at the cutoff.
+    """
+
+    def __init__(self, app, max_bytes: int, paths: tuple, response: dict):
+        self.app = app
+        self.max_bytes = max_bytes
+        self.paths = paths
+        self.body = json.dumps(response, ensure_ascii=False).encode()
+
+    async def reject(self, send):
+        await send({
+            "type": "http.response.start",
+            "status": 413,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(self.body)).encode())],
+        })
+        await send({"type": "http.response.body", "body": self.body})
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            return await self.app(scope, receive, send)
+
+        content_length = dict(scope["headers"]).get(b"content-length", b"")
+        if content_length.isdigit() and int(content_length) > self.max_bytes:
+            logger.warning(f"[Upload] Refused {scope['path']}: Content-Length {int(content_length)} bytes")
+            return await self.reject(send)
+
+        received = 0
+        exceeded = False
+        rejected = False
+
+        async def limited_receive():
+            nonlocal received, exceeded
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    exceeded = True
+                    raise BodyTooLarge(f"request body over {self.max_bytes} bytes")
+            return message
+
+        async def guarded_send(message):
+            # The body parser turns BodyTooLarge into its own error response: answer 413 instead
+            nonlocal rejected
+            if not exceeded:
+                return await send(message)
+            if message["type"] == "http.response.start" and not rejected:
+                rejected = True
+                await self.reject(send)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except BodyTooLarge:
+            if not rejected:
+                await self.reject(send)
+        if exceeded:
+            logger.warning(f"[Upload] Aborted {scope['path']}: over {self.max_bytes} bytes")
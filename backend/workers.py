@@ -0,0 +1,192 @@
+"""
+Bounded worker pools for the blocking pipeline stages of PasteFind
+(download, transcode, recognition)
+"""
+import asyncio
+import functools
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class PoolBusyError(Exception):
+    """Raised when a stage pool already holds its maximum number of jobs."""
+
+    def __init__(self, stage: str):
+        super().__init__(f"{stage} pool saturated")
+        self.stage = stage
+
+
+class StagePool:
+    """
+    Thread pool for one pipeline stage.
+    Accepts at most max_workers running + max_queue waiting jobs, then rejects.
+    """
+
+    def __init__(self, name: str, max_workers: int, max_queue: int):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"pf-{name}")
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._submitted = 0
+        self._rejected = 0
+        self._busy_seconds = 0.0
+
+    @property
+    def capacity(self) -> int:
+        return self.max_workers + self.max_queue
+
+    def has_capacity(self) -> bool:
+        with self._lock:
+            return self._pending < self.capacity
+
+    def _timed(self, func, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self._busy_seconds += elapsed
+
+    def _release(self, _future):
+        with self._lock:
+            self._pending -= 1
+
+    async def run(self, func, *args, **kwargs):
+        """Run a blocking callable in this pool. Raises PoolBusyError when saturated."""
+        with self._lock:
+            if self._pending >= self.capacity:
+                self._rejected += 1
+                raise PoolBusyError(self.name)
+            self._pending += 1
+            self._submitted += 1
+
+        # The slot is released when the thread finishes, not when the caller stops
+        # waiting, so cancelled requests still count until their work is done.
+        future = self._executor.submit(self._timed, func, *args, **kwargs)
+        future.add_done_callback(self._release)
+        return await asyncio.wrap_future(future)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.max_workers,
+                "queue_depth": self.max_queue,
+                "in_flight": self._pending,
+                "submitted": self._submitted,
+                "rejected": self._rejected,
+                "busy_seconds": round(self._busy_seconds, 2),
+            }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return max(1, int(os.getenv(name, default)))
+    except ValueError:
+        logger.warning(f"[Workers] Invalid {name}, using {default}")
+        return default
+
+
+_CPUS = os.cpu_count() or 2
+
+# Stage sizes: downloads are network-bound, transcodes and local fingerprinting
+# CPU-bound, AudD recognition HTTP-bound
+POOLS = {
+    "download": StagePool(
+        "download",
+        _env_int('DOWNLOAD_WORKERS', 8),
+        _env_int('DOWNLOAD_QUEUE_DEPTH', 32),
+    ),
+    "transcode": StagePool(
+        "transcode",
+        _env_int('TRANSCODE_WORKERS', _CPUS),
+        _env_int('TRANSCODE_QUEUE_DEPTH', 32),
+    ),
+    "recognize": StagePool(
+        "recognize",
+        _env_int('RECOGNIZE_WORKERS', 16),
+        _env_int('RECOGNIZE_QUEUE_DEPTH', 64),
+    ),
+    "fingerprint": StagePool(
+        "fingerprint",
+        _env_int('FINGERPRINT_WORKERS', _CPUS),
+        _env_int('FINGERPRINT_QUEUE_DEPTH', 64),
+    ),
+}
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent async calls by key: the first caller runs the work,
+    later callers with the same key await the same result. When every waiter
+    of a call has been cancelled, the call itself is cancelled.
+    """
+
+    def __init__(self):
+        self._inflight = {}
+        self._waiters = {}
+        self._leaders = 0
+        self._coalesced = 0
+        self._cancelled = 0
+
+    async def run(self, key: str, factory):
+        """Await factory() once per key among concurrent callers."""
+        task = self._inflight.get(key)
+        if task is None:
+            self._leaders += 1
+            task = asyncio.ensure_future(factory())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._inflight.pop(key) if self._inflight.get(key) is t else None)
+        else:
+            self._coalesced += 1
+
+        # Shield so one caller disconnecting does not cancel the shared call
+        self._waiters[task] = self._waiters.get(task, 0) + 1
+        try:
+            result = await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if self._waiters[task] == 1 and not task.done():
+                self._cancelled += 1
+                task.cancel()
+            raise
+        finally:
+            self._waiters[task] -= 1
+            if self._waiters[task] == 0:
+                del self._waiters[task]
+        return dict(result) if isinstance(result, dict) else result
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": len(self._inflight),
+            "leaders": self._leaders,
+            "coalesced": self._coalesced,
+            "cancelled": self._cancelled,
+        }
+
+
+async def run_stage(stage: str, func, *args, **kwargs):
+    """Run func(*args, **kwargs) in the named stage pool."""
+    return await POOLS[stage].run(functools.partial(func, *args, **kwargs))
+
+
+def pools_have_capacity(*stages: str) -> bool:
+    return all(POOLS[s].has_capacity() for s in stages)
+
+
+def pool_stats() -> dict:
+    return {name: pool.stats() for name, pool in POOLS.items()}
+
+
+def shutdown_pools():
+    for pool in POOLS.values():
+        pool.shutdown()
@@ -2,9 +2,10 @@
 YouTube API integration functions for PasteFind
 """
 import re
-import requests
 import logging
 
+from http_client import http
+
 logger = logging.getLogger(__name__)
 
 def extract_youtube_id(url: str) -> str:
@@ -43,7 +44,7 @@ def get_youtube_metadata(video_id: str, api_key: str) -> dict:
     }
     
     try:
-        response = requests.get(url, params=params, timeout=10)
+        response = http.get(url, params=params, timeout=10)
         response.raise_for_status()
         data = response.json()
         
@@ -66,20 +67,73 @@ def get_youtube_metadata(video_id: str, api_key: str) -> dict:
         return None
 
 
+# "(Official Music Video)", "[Official Audio]", "(Official Lyric Video)": only these mark a song title
+MUSIC_VIDEO_MARKER = re.compile(
+    r'[\(\[]\s*official\s+(?:music\s+)?(?:video|audio|lyric\s+video|visuali[sz]er)\s*[\)\]]',
+    re.IGNORECASE,
+)
+
+# Extractor track names that stand for the video's own audio or a placeholder, not a song
+ORIGINAL_SOUND = re.compile(
+    r'original sound|original audio|son original|sonido original|suono originale|som original|originalton'
+    r'|orijinal ses|оригинальный звук|promoted music|原声|原聲|オリジナル楽曲|오리지널 사운드',
+    re.IGNORECASE,
+)
+
+
+def is_music_video(title: str, metadata: dict) -> bool:
+    """
+    An official music video or audio upload: a music-video marker in the title, or
+    YouTube's Music category with "official" in it. "Official Highlights" or
+    "Official Trailer" alone is not enough.
+    """
+    if MUSIC_VIDEO_MARKER.search(title):
+        return True
+    return 'Music' in (metadata.get('categories') or []) and 'official' in title.lower()
+
+
 def identify_music_from_youtube_metadata(metadata: dict) -> dict:
     """
-    Try to identify music from YouTube metadata (title, description, tags)
-    This works for official music videos and videos with proper metadata
+    Try to identify music from page metadata: a YouTube Data API snippet
+    (title, description, tags) or a yt-dlp info_dict, whose extractors also
+    fill track / artists / album (YouTube Music, TikTok sounds, some reels).
+    Only 'high' confidence results are safe to return without listening:
+    structured extractor fields, auto-generated YouTube descriptions and
+    official YouTube video titles. Captions on other platforms rate 'medium'.
     """
     if not metadata:
         return None
     
-    title = metadata.get('title', '')
-    description = metadata.get('description', '')
-    tags = metadata.get('tags', [])
+    title = metadata.get('title') or ''
+    description = metadata.get('description') or ''
     
-    # Common patterns for music videos
-    # Pattern 1: "Artist - Song Title (Official Video)"
+    # Pattern 0: structured track metadata from the extractor
+    track = (metadata.get('track') or '').strip()
+    artist = (', '.join(metadata.get('artists') or []) or metadata.get('artist') or '').strip()
+    if track and artist and not ORIGINAL_SOUND.search(track):
+        return {
+            'title': track,
+            'artist': artist,
+            'album': metadata.get('album'),
+            'source': 'extractor_metadata',
+            'confidence': 'high'
+        }
+    
+    # Pattern 1: auto-generated "Provided to YouTube by ..." descriptions carry "Song · Artist"
+    if description.startswith('Provided to YouTube by'):
+        for line in description.split('\n')[1:5]:
+            if ' · ' in line:
+                song, artist = [part.strip() for part in line.split(' · ')[:2]]
+                return {
+                    'title': song,
+                    'artist': artist,
+                    'source': 'youtube_description',
+                    'confidence': 'high'
+                }
+    
+    # Common patterns for music videos (API snippets carry no extractor_key and are YouTube)
+    is_youtube = metadata.get('extractor_key', 'Youtube') == 'Youtube'
+    # Pattern 2: "Artist - Song Title (Official Video)"
     match = re.search(r'^(.+?)\s*[-–—]\s*(.+?)(?:\s*\(.*\))?$', title)
     if match:
         artist = match.group(1).strip()
@@ -93,29 +147,28 @@ def identify_music_from_youtube_metadata(metadata: dict) -> dict:
             'title': song,
             'artist': artist,
             'source': 'youtube_metadata',
-            'confidence': 'high' if 'official' in title.lower() else 'medium'
+            'confidence': 'high' if is_youtube and is_music_video(title, metadata) else 'medium'
         }
     
-    # Pattern 2: Look for artist/song in description
+    # Pattern 3: Look for artist/song in description
+    artist = song = None
     desc_lines = description.split('\n')
     for line in desc_lines[:5]:  # Check first 5 lines
-        if 'artist:' in line.lower():
-            artist_match = re.search(r'artist:\s*(.+)', line, re.IGNORECASE)
-            if artist_match:
-                artist = artist_match.group(1).strip()
-        if 'song:' in line.lower() or 'title:' in line.lower():
-            song_match = re.search(r'(?:song|title):\s*(.+)', line, re.IGNORECASE)
-            if song_match:
-                song = song_match.group(1).strip()
-                
-                # If we found both
-                if 'artist' in locals() and 'song' in locals():
-                    return {
-                        'title': song,
-                        'artist': artist,
-                        'source': 'youtube_description',
-                        'confidence': 'medium'
-                    }
+        artist_match = re.search(r'artist:\s*(.+)', line, re.IGNORECASE)
+        if artist_match:
+            artist = artist_match.group(1).strip()
+        song_match = re.search(r'(?:song|title):\s*(.+)', line, re.IGNORECASE)
+        if song_match:
+            song = song_match.group(1).strip()
+        
+        # If we found both
+        if artist and song:
+            return {
+                'title': song,
+                'artist': artist,
+                'source': 'youtube_description',
+                'confidence': 'medium'
+            }
     
     return None
 
@@ -137,7 +190,7 @@ def download_youtube_audio_rapidapi(video_id: str, rapidapi_key: str) -> str:
     }
     
     try:
-        response = requests.get(url, headers=headers, params=querystring, timeout=30)
+        response = http.get(url, headers=headers, params=querystring, timeout=30)
         response.raise_for_status()
         data = response.json()
         
@@ -145,7 +198,7 @@ def download_youtube_audio_rapidapi(video_id: str, rapidapi_key: str) -> str:
             download_url = data.get('link')
             if download_url:
                 # Download the audio file
-                audio_response = requests.get(download_url, timeout=60)
+                audio_response = http.get(download_url, timeout=60)
                 audio_response.raise_for_status()
                 
                 # Save to temp file